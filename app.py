@@ -1,13 +1,33 @@
-from flask import Flask, request, jsonify, send_file, render_template
-from video_processor import VideoProcessor
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template
+from video_processor import VideoProcessor, RENDER_BACKEND, RENDER_BACKENDS
+from parallel_render import render_parts, RENDER_WORKERS
+from transcript_cache import get_cache, remember_digest
+from artifact_store import get_store
+from job_queue import JobStore, JobQueue, QueueFull, MAX_QUEUED_JOBS
+from scheduler import get_scheduler, estimate_job_memory
+from instrumentation import Instrumentation, StageMetrics, ProgressTracker
+import model_registry
+import chunked_upload
+import stream_split
+import render_profiles
+import io
 import os
+import shutil
 import tempfile
+import uuid
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import NotFound
 import json
 from datetime import datetime
 
 app = Flask(__name__)
 
+# Let a front proxy (nginx X-Accel / Apache X-Sendfile) serve finished parts
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Finished parts never change, so clients may cache them
+DOWNLOAD_MAX_AGE = int(os.environ.get('DOWNLOAD_MAX_AGE', 3600))
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -18,110 +38,306 @@ PROCESSED_FOLDER = 'processed'
 if not os.path.exists(PROCESSED_FOLDER):
     os.makedirs(PROCESSED_FOLDER)
 
-# Store processing status
-processing_status = {}
+# Optionally load Whisper when the worker starts so the first job doesn't pay for it
+if os.environ.get('WHISPER_WARMUP', '').lower() in ('1', 'true', 'yes'):
+    model_registry.warm_up()
+
+def run_job(job, report):
+    """Render an uploaded job; called from a background render worker"""
+    params = job['params']
+    job_folder = params['job_folder']
+    split_type = params['split_type']
+    split_value = params['split_value']
+    
+    # The render worker may be another process than the one that took the upload
+    for name in ('gameplay', 'attention'):
+        if params.get(f'{name}_path') and params.get(f'{name}_sha256'):
+            remember_digest(params[f'{name}_path'], params[f'{name}_sha256'])
+    
+    if params.get('split_mode') == 'copy':
+        # Gameplay only: cut on keyframes with stream copy, no decode or encode
+        ranges = stream_split.plan_ranges(params['gameplay_path'], split_type, split_value)
+        output_paths = [os.path.join(job_folder, f'part_{i}{os.path.splitext(params["gameplay_path"])[1]}')
+                        for i in range(1, len(ranges) + 1)]
+        
+        def on_part_done(completed, total, output_path):
+            report(progress=(completed / total) * 100)
+        
+        report(files=stream_split.copy_split(params['gameplay_path'], ranges, output_paths,
+                                             progress_callback=on_part_done))
+        return
+    
+    # Stage timings feed /metrics, frame events feed /status
+    instrumentation = Instrumentation([stage_metrics.listener])
+    
+    # Initialize video processor
+    processor = VideoProcessor(params['gameplay_path'], params['attention_path'],
+                               render_backend=params.get('backend'),
+                               profile=params.get('profile'),
+                               instrumentation=instrumentation)
+    try:
+        if split_type == 'duration':
+            # Split by duration
+            ranges = processor.part_ranges(float(split_value))
+        elif split_type == 'parts':
+            # Split by number of parts
+            ranges = processor.part_ranges_for_count(int(split_value))
+        else:
+            # Process single video
+            ranges = [(0, processor.gameplay.duration)]
+        
+        output_paths = [os.path.join(job_folder, f'part_{i}.mp4')
+                        for i in range(1, len(ranges) + 1)]
+        
+        frames_total = sum(processor.frame_count(start, end) for start, end in ranges)
+        instrumentation.add_listener(ProgressTracker(frames_total, report).listener)
+        
+        # Parts are independent, so they can be encoded concurrently
+        files = render_parts(processor, ranges, output_paths)
+        report(files=files)
+    finally:
+        # Stop this job's ffmpeg readers now rather than whenever it's collected
+        processor.close()
+
+# Job state lives in SQLite so every gunicorn worker sees the same status
+job_store = JobStore()
+stage_metrics = StageMetrics(job_store.path)
+# Jobs are admitted against their memory estimate so a busy worker queues instead of swapping
+job_queue = JobQueue(job_store, run_job, scheduler=get_scheduler(),
+                     estimate=lambda params: estimate_job_memory(params, RENDER_WORKERS))
+
+@app.before_request
+def start_render_workers():
+    job_queue.start()
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', profiles=render_profiles.PROFILES,
+                           default_profile=render_profiles.DEFAULT_PROFILE)
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable chunked upload"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    if not filename:
+        return jsonify({'error': 'Missing filename'}), 400
+    
+    size = data.get('size')
+    # Sweep abandoned sessions whenever a new one starts
+    chunked_upload.expire(UPLOAD_FOLDER)
+    upload_id = chunked_upload.create(UPLOAD_FOLDER, filename, int(size) if size is not None else None)
+    return jsonify({'upload_id': upload_id, 'offset': 0}), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Report how many bytes have arrived so a client can resume"""
+    try:
+        status = chunked_upload.status(UPLOAD_FOLDER, upload_id)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'offset': status['offset'], 'size': status['size'], 'completed': status['sha256'] is not None})
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append the raw request body at ?offset=N, streamed straight to disk"""
+    try:
+        offset = int(request.args.get('offset', '0'))
+        new_offset = chunked_upload.append(UPLOAD_FOLDER, upload_id, offset, request.stream)
+    except ValueError:
+        return jsonify({'error': 'Invalid offset'}), 400
+    except chunked_upload.OffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'offset': new_offset})
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    try:
+        sha256 = chunked_upload.complete(UPLOAD_FOLDER, upload_id)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'upload_id': upload_id, 'sha256': sha256})
+
+def store_input(name, job_folder):
+    """Put the named input into the job folder, from a chunked upload or a multipart file"""
+    upload_id = request.form.get(f'{name}_upload')
+    if upload_id:
+        path, sha256 = chunked_upload.claim(UPLOAD_FOLDER, upload_id, job_folder, secure_filename)
+    else:
+        file = request.files[name]
+        path = os.path.join(job_folder, secure_filename(file.filename))
+        sha256 = chunked_upload.save_stream(file.stream, path)
+    
+    # The hash feeds content-addressed caches without re-reading the file
+    remember_digest(path, sha256)
+    return path, sha256
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
-    if 'gameplay' not in request.files or 'attention' not in request.files:
-        return jsonify({'error': 'Missing files'}), 400
+    # Stream-copy splits only cut the gameplay, so no attention clip is needed
+    split_mode = request.form.get('split_mode', 'render')
+    if split_mode not in ('render', 'copy'):
+        return jsonify({'error': f'Unknown split mode: {split_mode}'}), 400
+    inputs = ('gameplay',) if split_mode == 'copy' else ('gameplay', 'attention')
     
-    gameplay_file = request.files['gameplay']
-    attention_file = request.files['attention']
+    for name in inputs:
+        if not request.form.get(f'{name}_upload'):
+            if name not in request.files:
+                return jsonify({'error': 'Missing files'}), 400
+            if request.files[name].filename == '':
+                return jsonify({'error': 'No files selected'}), 400
     
-    if gameplay_file.filename == '' or attention_file.filename == '':
-        return jsonify({'error': 'No files selected'}), 400
+    # Refuse early rather than storing uploads we can't schedule
+    if job_store.count('queued') >= MAX_QUEUED_JOBS:
+        return jsonify({'error': 'Too many jobs queued, try again later'}), 429
     
     # Create unique folder for this processing job
-    job_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
     job_folder = os.path.join(PROCESSED_FOLDER, job_id)
     os.makedirs(job_folder)
     
     # Save uploaded files
-    gameplay_path = os.path.join(job_folder, secure_filename(gameplay_file.filename))
-    attention_path = os.path.join(job_folder, secure_filename(attention_file.filename))
-    
-    gameplay_file.save(gameplay_path)
-    attention_file.save(attention_path)
+    try:
+        gameplay_path, gameplay_sha256 = store_input('gameplay', job_folder)
+        attention_path = attention_sha256 = None
+        if 'attention' in inputs:
+            attention_path, attention_sha256 = store_input('attention', job_folder)
+    except chunked_upload.UploadError as e:
+        shutil.rmtree(job_folder, ignore_errors=True)
+        return jsonify({'error': str(e)}), 400
     
     # Get processing parameters
     split_type = request.form.get('split_type', 'none')
     split_value = request.form.get('split_value', '0')
+    backend = request.form.get('backend', RENDER_BACKEND)
+    if backend not in RENDER_BACKENDS:
+        shutil.rmtree(job_folder, ignore_errors=True)
+        return jsonify({'error': f'Unknown render backend: {backend}'}), 400
+    profile = request.form.get('profile', render_profiles.DEFAULT_PROFILE)
+    if profile not in render_profiles.PROFILES:
+        shutil.rmtree(job_folder, ignore_errors=True)
+        return jsonify({'error': f'Unknown render profile: {profile}'}), 400
     
-    # Start processing in background
-    processing_status[job_id] = {
-        'status': 'processing',
-        'progress': 0,
-        'files': []
-    }
+    try:
+        job_queue.submit(job_id, {
+            'job_folder': job_folder,
+            'gameplay_path': gameplay_path,
+            'gameplay_sha256': gameplay_sha256,
+            'attention_path': attention_path,
+            'attention_sha256': attention_sha256,
+            'split_type': split_type,
+            'split_value': split_value,
+            'split_mode': split_mode,
+            'backend': backend,
+            'profile': profile,
+        })
+    except QueueFull:
+        shutil.rmtree(job_folder, ignore_errors=True)
+        return jsonify({'error': 'Too many jobs queued, try again later'}), 429
     
+    return jsonify({
+        'job_id': job_id,
+        'message': 'Processing started',
+        'status': 'success'
+    }), 202
+
+@app.route('/preview', methods=['POST'])
+def preview():
+    """A few low-resolution composed stills as one PNG, to check the layout before rendering.
+
+    Takes the same gameplay/attention inputs as /upload. Chunked uploads are
+    read in place, so the same ids can be submitted for the real job after.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='preview_')
     try:
-        # Initialize video processor
-        processor = VideoProcessor(gameplay_path, attention_path)
-        
-        if split_type == 'none':
-            # Process single video
-            final_video = processor.process_videos()
-            output_path = os.path.join(job_folder, 'part_1.mp4')
-            final_video.write_videofile(output_path)
-            processing_status[job_id]['files'].append(output_path)
-            
-        elif split_type == 'duration':
-            # Split by duration
-            duration = float(split_value)
-            parts = processor.split_by_duration(duration)
-            
-            for i, part in enumerate(parts, 1):
-                output_path = os.path.join(job_folder, f'part_{i}.mp4')
-                part.write_videofile(output_path)
-                processing_status[job_id]['files'].append(output_path)
-                processing_status[job_id]['progress'] = (i / len(parts)) * 100
-                
-        elif split_type == 'parts':
-            # Split by number of parts
-            num_parts = int(split_value)
-            parts = processor.split_by_parts(num_parts)
-            
-            for i, part in enumerate(parts, 1):
-                output_path = os.path.join(job_folder, f'part_{i}.mp4')
-                part.write_videofile(output_path)
-                processing_status[job_id]['files'].append(output_path)
-                processing_status[job_id]['progress'] = (i / num_parts) * 100
+        paths = {}
+        for name in ('gameplay', 'attention'):
+            upload_id = request.form.get(f'{name}_upload')
+            if upload_id:
+                path, sha256 = chunked_upload.completed_path(UPLOAD_FOLDER, upload_id)
+            elif request.files.get(name) and request.files[name].filename:
+                path = os.path.join(temp_dir, f'{name}_{secure_filename(request.files[name].filename)}')
+                sha256 = chunked_upload.save_stream(request.files[name].stream, path)
+            else:
+                return jsonify({'error': 'Missing files'}), 400
+            remember_digest(path, sha256)
+            paths[name] = path
         
-        processing_status[job_id]['status'] = 'completed'
-        return jsonify({
-            'job_id': job_id,
-            'message': 'Processing started',
-            'status': 'success'
-        })
+        start = float(request.form.get('start', 0))
+        end = float(request.form['end']) if request.form.get('end') else None
+        frames = min(8, max(1, int(request.form.get('frames', 4))))
         
+        with VideoProcessor(paths['gameplay'], paths['attention']) as processor:
+            image = processor.preview(start, end, frames=frames)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid preview range'}), 400
     except Exception as e:
-        processing_status[job_id]['status'] = 'failed'
-        processing_status[job_id]['error'] = str(e)
-        return jsonify({
-            'error': str(e)
-        }), 500
+        # Model or ffmpeg failures; the page reads the error from JSON
+        app.logger.exception('Preview failed')
+        return jsonify({'error': f'Preview failed: {e}'}), 500
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return Response(buffer.getvalue(), mimetype='image/png')
 
 @app.route('/status/<job_id>', methods=['GET'])
 def get_status(job_id):
-    if job_id not in processing_status:
+    job = job_store.get(job_id)
+    if job is None:
         return jsonify({'error': 'Job not found'}), 404
     
-    return jsonify(processing_status[job_id])
+    status = {
+        'status': job['status'],
+        'progress': job['progress'],
+        'eta_seconds': job['eta'],
+        'frames_done': job['frames_done'],
+        'frames_total': job['frames_total'],
+        'files': job['files']
+    }
+    if job['error']:
+        status['error'] = job['error']
+    return jsonify(status)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'transcripts': get_cache().stats(), 'artifacts': get_store().stats(),
+                    'scheduler': {**get_scheduler().stats(), 'reserved_bytes': job_store.reserved_memory()}})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies, jobs and cache counters"""
+    lines = stage_metrics.prometheus_lines()
+    
+    lines += ['# HELP video_jobs Jobs by status.', '# TYPE video_jobs gauge']
+    for status, count in sorted(job_store.counts().items()):
+        lines.append(f'video_jobs{{status="{status}"}} {count}')
+    
+    # Cache counters are per process
+    lines += ['# HELP video_transcript_cache_total Transcript cache lookups in this worker.',
+              '# TYPE video_transcript_cache_total counter']
+    for result, count in get_cache().stats().items():
+        lines.append(f'video_transcript_cache_total{{result="{result}",pid="{os.getpid()}"}} {count}')
+    
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 @app.route('/download/<job_id>/<filename>', methods=['GET'])
 def download_file(job_id, filename):
-    job_folder = os.path.join(PROCESSED_FOLDER, job_id)
-    file_path = os.path.join(job_folder, filename)
+    job_folder = os.path.abspath(os.path.join(PROCESSED_FOLDER, secure_filename(job_id)))
     
-    if not os.path.exists(file_path):
+    # Range requests, ETags and If-None-Match / If-Modified-Since are handled by
+    # the conditional response; whole-file responses go through the server's
+    # file wrapper (sendfile) or X-Sendfile when a front proxy is configured
+    try:
+        return send_from_directory(job_folder, filename, as_attachment=True,
+                                   conditional=True, etag=True, max_age=DOWNLOAD_MAX_AGE)
+    except NotFound:
         return jsonify({'error': 'File not found'}), 404
-    
-    return send_file(file_path, as_attachment=True)
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
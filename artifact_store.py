@@ -0,0 +1,171 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+import disk_cache
+
+# Store location and size bound can be overridden per deployment
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', os.path.join('cache', 'artifacts'))
+ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_MAX_BYTES', 20 * 1024 * 1024 * 1024))
+# Also keep each part's scaled gameplay layer; costs one extra encode the first time
+ARTIFACT_LAYERS = os.environ.get('ARTIFACT_LAYERS', '').lower() in ('1', 'true', 'yes')
+
+
+def _link_or_copy(source, destination, copy=True):
+    """Hard-link source to destination (replacing it), copying across filesystems.
+
+    Returns False, leaving destination alone, when the link fails and copy is False.
+    """
+    # Renaming a link onto another link of the same file is a no-op that would leave the temp behind
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return True
+    temp_path = f'{destination}.{os.getpid()}.tmp'
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        if not copy:
+            return False
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, destination)
+    return True
+
+
+class ArtifactStore:
+    """Content-addressed on-disk store for intermediate and final render results.
+
+    Each artifact is a file under <root>/<kind>/ named by a hash of every
+    input and parameter that shapes it, so changing one input only misses
+    the artifacts that depend on it. Recency is tracked through file mtimes
+    and the least recently used files are evicted past max_bytes, as in
+    TranscriptCache.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or ARTIFACT_DIR
+        self.max_bytes = ARTIFACT_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+    def make_key(self, kind, **inputs):
+        payload = json.dumps({'kind': kind, 'inputs': inputs}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, kind, key, suffix=''):
+        return os.path.join(self.root, kind, f'{key}{suffix}')
+
+    def _count(self, counters, kind):
+        with self._lock:
+            counters[kind] = counters.get(kind, 0) + 1
+
+    def contains(self, kind, key, suffix=''):
+        """Whether an artifact is stored, without counting a lookup or touching it"""
+        return os.path.exists(self.path(kind, key, suffix))
+
+    def get(self, kind, key, suffix=''):
+        """Return the stored file's path, or None on a miss"""
+        path = self.path(kind, key, suffix)
+        try:
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except OSError:
+            self._count(self.misses, kind)
+            return None
+        self._count(self.hits, kind)
+        return path
+
+    def temp_path(self, kind, suffix=''):
+        """A fresh path inside the store to write an artifact to before commit()"""
+        os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.root, kind), suffix=f'.tmp{suffix}')
+        os.close(fd)
+        return temp_path
+
+    def commit(self, temp_path, kind, key, suffix=''):
+        """Move a file written at temp_path into place and return its store path"""
+        path = self.path(kind, key, suffix)
+        # Atomic rename so concurrent readers never see a partial artifact
+        os.replace(temp_path, path)
+        self._evict()
+        return path
+
+    def put_file(self, kind, key, suffix, source_path, link_only=False):
+        """Store a copy of source_path (a hard link when possible).
+
+        With link_only, nothing is stored (and None returned) when source_path
+        is on another filesystem, rather than paying for a full copy.
+        """
+        os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        path = self.path(kind, key, suffix)
+        if not _link_or_copy(source_path, path, copy=not link_only):
+            return None
+        self._evict()
+        return path
+
+    def materialize(self, path, destination):
+        """Place a stored artifact at destination without re-encoding it"""
+        _link_or_copy(path, destination)
+        return destination
+
+    def get_arrays(self, kind, key):
+        """Return (meta, arrays) stored by put_arrays, or None on a miss"""
+        path = self.get(kind, key, '.npz')
+        if path is None:
+            return None
+        with np.load(path) as data:
+            meta = json.loads(bytes(data['meta']).decode('utf-8'))
+            arrays = [data[f'array_{i}'] for i in range(len(data.files) - 1)]
+        return meta, arrays
+
+    def put_arrays(self, kind, key, meta, arrays):
+        """Store JSON-able meta and a list of arrays as one .npz artifact"""
+        buffer = io.BytesIO()
+        np.savez(buffer,
+                 meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                 **{f'array_{i}': array for i, array in enumerate(arrays)})
+        temp_path = self.temp_path(kind, '.npz')
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(buffer.getvalue())
+            return self.commit(temp_path, kind, key, '.npz')
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _evict(self):
+        """Remove least recently used artifacts until the store fits max_bytes"""
+        removed = disk_cache.evict(self.root, self.max_bytes)
+        with self._lock:
+            self.evictions += len(removed)
+
+    def stats(self):
+        """Per-kind hit/miss counters for this process"""
+        with self._lock:
+            return {
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+                'evictions': self.evictions,
+            }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide artifact store"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+import disk_cache
+from transcript_cache import file_digest
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# Whisper's input format: mono float32 at 16 kHz
+SAMPLE_RATE = 16000
+
+# Decoded tracks, shared by every job on the host
+AUDIO_CACHE_DIR = os.environ.get('AUDIO_CACHE_DIR', os.path.join('cache', 'audio'))
+# Tracks larger than this once decoded are read per request instead of cached
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+# Total size of AUDIO_CACHE_DIR; least recently used tracks are removed past it
+AUDIO_CACHE_DIR_MAX_BYTES = int(os.environ.get('AUDIO_CACHE_DIR_MAX_BYTES', 4 * 1024 * 1024 * 1024))
+
+# Open memmaps, so jobs in one process share a single mapping per track
+_open_tracks = {}
+_lock = threading.Lock()
+
+
+def _decode_command(path, start_time=0, end_time=None):
+    command = [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error']
+    if start_time:
+        command += ['-ss', f'{start_time:.6f}']
+    command += ['-i', path]
+    if end_time is not None:
+        command += ['-t', f'{end_time - start_time:.6f}']
+    return command + ['-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-']
+
+
+def decode(path, start_time=0, end_time=None):
+    """Decode [start_time, end_time) of path's audio straight into a float32 array"""
+    result = subprocess.run(_decode_command(path, start_time, end_time),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg audio decode failed: {result.stderr.decode(errors="replace").strip()}')
+    # bytearray keeps the array writable, which torch.from_numpy wants
+    return np.frombuffer(bytearray(result.stdout), dtype=np.float32)
+
+
+def load_track(path, duration=None, build=True):
+    """Return path's whole decoded track as a memory-mapped float32 array.
+
+    The track is decoded once into AUDIO_CACHE_DIR, keyed by the source
+    digest. Returns None when it would exceed AUDIO_CACHE_MAX_BYTES, or
+    when build is False and it isn't cached yet.
+    """
+    if duration is not None and duration * SAMPLE_RATE * 4 > AUDIO_CACHE_MAX_BYTES:
+        return None
+
+    key = file_digest(path)
+    track_path = os.path.join(AUDIO_CACHE_DIR, f'{key}.f32')
+    with _lock:
+        if key in _open_tracks:
+            disk_cache.touch(track_path)
+            return _open_tracks[key]
+
+        if os.path.exists(track_path):
+            disk_cache.touch(track_path)
+        else:
+            if not build:
+                return None
+            os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+            _build(path, track_path)
+            for evicted in disk_cache.evict(AUDIO_CACHE_DIR, AUDIO_CACHE_DIR_MAX_BYTES, '.f32', keep=track_path):
+                _open_tracks.pop(os.path.basename(evicted)[:-len('.f32')], None)
+
+        # Copy-on-write: writable for torch, the file itself is never modified
+        track = np.memmap(track_path, dtype=np.float32, mode='c')
+        _open_tracks[key] = track
+        return track
+
+
+def _build(path, track_path):
+    """Stream ffmpeg's decoded samples into the cache file"""
+    with disk_cache.atomic_path(track_path) as temp_path, open(temp_path, 'wb') as f:
+        process = subprocess.Popen(_decode_command(path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        shutil.copyfileobj(process.stdout, f, 1024 * 1024)
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f'ffmpeg audio decode failed: {stderr.decode(errors="replace").strip()}')
+
+
+def samples(path, start_time, end_time, duration=None, build=True):
+    """Mono 16 kHz float32 samples of [start_time, end_time).
+
+    Sliced from the cached track when there is one; otherwise only the
+    range is decoded.
+    """
+    track = load_track(path, duration, build)
+    if track is None:
+        return decode(path, start_time, end_time)
+    return track[int(start_time * SAMPLE_RATE):int(end_time * SAMPLE_RATE)]
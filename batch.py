@@ -0,0 +1,282 @@
+"""Headless batch renderer.
+
+Renders every gameplay file of a manifest against a pool of attention
+clips, with the parts of all items spread over a pool of worker processes.
+Parts whose output exists and was rendered from the same inputs and
+settings are skipped, so an interrupted run can simply be started again.
+
+    python batch.py manifest.json --workers 4 --report report.json
+
+The manifest is JSON:
+
+    {
+        "output_dir": "out",
+        "attention_pool": ["attention/a.mp4", "attention/"],
+        "split": {"type": "duration", "value": 60},
+        "backend": "ffmpeg",
+        "profile": "balanced",
+        "items": [
+            "gameplay/one.mp4",
+            {"gameplay": "gameplay/two.mp4", "attention": "attention/b.mp4",
+             "split": {"type": "parts", "value": 3}}
+        ]
+    }
+
+Relative paths are resolved against the manifest's folder. Directories in
+attention_pool contribute every video inside them; items without their own
+attention clip get a stable pick from the pool.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from parallel_render import render_part_worker
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+def _resolve(base_dir, path):
+    return os.path.normpath(os.path.join(base_dir, os.path.expanduser(path)))
+
+
+def attention_pool(paths, base_dir):
+    """Expand the pool entries (files or folders) into a sorted list of clips"""
+    pool = []
+    for entry in paths:
+        path = _resolve(base_dir, entry)
+        if os.path.isdir(path):
+            pool += [os.path.join(path, name) for name in os.listdir(path)
+                     if name.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            pool.append(path)
+    return sorted(pool)
+
+
+def pick_attention(gameplay_path, pool):
+    """Same gameplay file, same attention clip, on every run"""
+    if not pool:
+        raise ValueError(f'No attention clip for {gameplay_path}')
+    return pool[zlib.crc32(os.path.basename(gameplay_path).encode()) % len(pool)]
+
+
+def load_manifest(path):
+    """Read a manifest into a list of fully specified items"""
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    pool = attention_pool(manifest.get('attention_pool', []), base_dir)
+    output_dir = _resolve(base_dir, manifest.get('output_dir', 'output'))
+    defaults = {
+        'split': manifest.get('split', {'type': 'none'}),
+        'backend': manifest.get('backend'),
+        'profile': manifest.get('profile'),
+        'attention_phase': manifest.get('attention_phase'),
+    }
+
+    items = []
+    for entry in manifest['items']:
+        if isinstance(entry, str):
+            entry = {'gameplay': entry}
+        item = dict(defaults, **entry)
+        item['gameplay'] = _resolve(base_dir, item['gameplay'])
+        if item.get('attention'):
+            item['attention'] = _resolve(base_dir, item['attention'])
+        else:
+            item['attention'] = pick_attention(item['gameplay'], pool)
+        name = os.path.splitext(os.path.basename(item['gameplay']))[0]
+        item['output_dir'] = _resolve(output_dir, item.get('output_dir', name))
+        items.append(item)
+    return items
+
+
+def plan_ranges(processor, split):
+    split_type = split.get('type', 'none')
+    if split_type == 'duration':
+        return processor.part_ranges(float(split['value']))
+    if split_type == 'parts':
+        return processor.part_ranges_for_count(int(split['value']))
+    return [(0, processor.gameplay.duration)]
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _sidecar(output_path):
+    return output_path + '.params.json'
+
+
+def is_up_to_date(output_path, digest):
+    """True when output_path exists and was rendered with the same params hash"""
+    try:
+        with open(_sidecar(output_path)) as f:
+            recorded = json.load(f).get('hash')
+    except (OSError, ValueError):
+        return False
+    return recorded == digest and os.path.exists(output_path)
+
+
+def write_sidecar(output_path, params, digest):
+    temp_path = _sidecar(output_path) + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'hash': digest, 'params': params}, f, indent=2)
+    os.replace(temp_path, _sidecar(output_path))
+
+
+def _timed_render(gameplay_path, attention_path, options, start_time, end_time, output_path):
+    start = time.perf_counter()
+    render_part_worker(gameplay_path, attention_path, options, start_time, end_time, output_path)
+    return time.perf_counter() - start
+
+
+def plan_item(item):
+    """Open an item, transcribe it if needed and return the parts left to render"""
+    from video_processor import VideoProcessor
+
+    processor = VideoProcessor(item['gameplay'], item['attention'],
+                               render_backend=item.get('backend'),
+                               profile=item.get('profile'),
+                               attention_phase=item.get('attention_phase'))
+    try:
+        os.makedirs(item['output_dir'], exist_ok=True)
+        parts = []
+        skipped = 0
+        for i, (start_time, end_time) in enumerate(plan_ranges(processor, item['split']), 1):
+            output_path = os.path.join(item['output_dir'], f'part {i}.mp4')
+            params = processor.part_params(start_time, end_time)
+            digest = params_hash(params)
+            if is_up_to_date(output_path, digest):
+                skipped += 1
+                continue
+            parts.append({'range': (start_time, end_time), 'output': output_path,
+                          'params': params, 'hash': digest})
+
+        transcription_seconds = 0.0
+        if parts:
+            # Once, here; the workers read the transcript from the shared cache
+            start = time.perf_counter()
+            processor.transcript()
+            transcription_seconds = time.perf_counter() - start
+        return processor.worker_options(), parts, skipped, transcription_seconds
+    finally:
+        processor.close()
+
+
+def run_batch(items, workers=1, log=print):
+    """Render every item and return the per-item report.
+
+    Items are planned and transcribed one after another in this process
+    (so one Whisper model serves the whole batch) while the worker pool
+    encodes the parts of the items already planned.
+    """
+    started = time.perf_counter()
+    reports = []
+    for item in items:
+        reports.append({
+            'gameplay': item['gameplay'],
+            'attention': item['attention'],
+            'output_dir': item['output_dir'],
+            'status': 'pending',
+            'parts_total': 0,
+            'parts_rendered': 0,
+            'parts_skipped': 0,
+            'transcription_seconds': 0.0,
+            'render_seconds': 0.0,
+            'error': None,
+        })
+
+    def finish_part(report, part, seconds):
+        write_sidecar(part['output'], part['params'], part['hash'])
+        report['parts_rendered'] += 1
+        report['render_seconds'] += seconds
+        log(f"{os.path.basename(report['gameplay'])}: {os.path.basename(part['output'])} "
+            f"in {seconds:.1f}s")
+
+    def fail(report, error):
+        report['status'] = 'failed'
+        report['error'] = str(error)
+        log(f"{os.path.basename(report['gameplay'])}: failed: {error}")
+
+    pool = None
+    if workers > 1:
+        # Spawn rather than fork: ffmpeg reader pipes and torch threads don't survive fork
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    futures = {}
+    try:
+        for item, report in zip(items, reports):
+            try:
+                options, parts, skipped, transcription_seconds = plan_item(item)
+            except Exception as e:
+                fail(report, e)
+                continue
+            report['parts_total'] = len(parts) + skipped
+            report['parts_skipped'] = skipped
+            report['transcription_seconds'] = transcription_seconds
+            report['status'] = 'rendering' if parts else 'up_to_date'
+
+            for part in parts:
+                args = (item['gameplay'], item['attention'], options, *part['range'], part['output'])
+                if pool is None:
+                    try:
+                        finish_part(report, part, _timed_render(*args))
+                    except Exception as e:
+                        fail(report, e)
+                        break
+                else:
+                    futures[pool.submit(_timed_render, *args)] = (report, part)
+
+        for future in as_completed(futures):
+            report, part = futures[future]
+            try:
+                finish_part(report, part, future.result())
+            except Exception as e:
+                fail(report, e)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    for report in reports:
+        if report['status'] == 'rendering':
+            report['status'] = 'rendered'
+
+    return {
+        'workers': workers,
+        'wall_seconds': time.perf_counter() - started,
+        'items': reports,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render a batch of gameplay videos')
+    parser.add_argument('manifest', help='JSON manifest of gameplay files and settings')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Parts encoded at once across all items')
+    parser.add_argument('--report', help='Write the summary report as JSON to this path')
+    args = parser.parse_args(argv)
+
+    items = load_manifest(args.manifest)
+    summary = run_batch(items, workers=max(1, args.workers))
+
+    for report in summary['items']:
+        print(f"{report['status']:>10}  {os.path.basename(report['gameplay'])}  "
+              f"rendered={report['parts_rendered']} skipped={report['parts_skipped']}  "
+              f"transcribe={report['transcription_seconds']:.1f}s render={report['render_seconds']:.1f}s")
+    print(f"Total wall time {summary['wall_seconds']:.1f}s with {summary['workers']} workers")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    return 1 if any(report['status'] == 'failed' for report in summary['items']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Render pipeline benchmark.
+
+Generates synthetic gameplay/attention clips with ffmpeg (testsrc video and
+a sine tone), then times each stage of VideoProcessor: model load, audio
+extraction, transcription, subtitle rasterization, compositing and encoding.
+Whisper is stubbed by default so no model weights are needed.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import audio_cache
+import frame_cache
+import model_registry
+import render_profiles
+import subtitle_renderer
+from artifact_store import ArtifactStore
+from transcript_cache import TranscriptCache
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+DEFAULT_RESOLUTIONS = ['640x360', '1280x720', '1920x1080']
+DEFAULT_DURATIONS = [10.0, 30.0]
+ATTENTION_RESOLUTION = '480x270'
+ATTENTION_DURATION = 5.0
+
+
+class StubWhisperModel:
+    """Stands in for Whisper: emits a short segment every few seconds"""
+
+    words = ['this', 'is', 'a', 'synthetic', 'benchmark', 'caption', 'line', 'for', 'timing']
+
+    def __init__(self, segment_every=3.0, segment_length=2.5):
+        self.segment_every = segment_every
+        self.segment_length = segment_length
+
+    def transcribe(self, audio, **options):
+        duration = _media_duration(audio) if isinstance(audio, str) else len(audio) / 16000
+        segments = []
+        start = 0.0
+        while start + self.segment_length <= duration:
+            step = self.segment_length / len(self.words)
+            words = [
+                {'word': f' {word}', 'start': start + i * step, 'end': start + (i + 1) * step}
+                for i, word in enumerate(self.words)
+            ]
+            segments.append({
+                'start': start,
+                'end': start + self.segment_length,
+                'text': ''.join(word['word'] for word in words),
+                'words': words,
+            })
+            start += self.segment_every
+        return {'segments': segments}
+
+
+def _media_duration(path):
+    from moviepy.editor import AudioFileClip
+    clip = AudioFileClip(path)
+    try:
+        return clip.duration
+    finally:
+        clip.close()
+
+
+def generate_fixture(path, resolution, duration, with_audio=True):
+    """Write a synthetic test clip unless it already exists"""
+    if os.path.exists(path):
+        return path
+    command = [
+        FFMPEG_BINARY, '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size={resolution}:rate=30:duration={duration}',
+    ]
+    if with_audio:
+        command += ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}', '-c:a', 'aac']
+    command += ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path]
+    subprocess.run(command, check=True)
+    return path
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished children (ffmpeg)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(own, children) / scale
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, name):
+        return _Stage(self, name)
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.stages[self.name] = time.perf_counter() - self.start
+
+
+def run_case(gameplay_path, attention_path, work_dir, backend, model_name, profile=None, vad=False):
+    """Time every stage for one fixture and return the measurements.
+
+    The fixture's audio is a sine tone, which the speech detector rejects,
+    so it is off unless asked for; with it on only the detector is timed.
+    """
+    from video_processor import VideoProcessor
+
+    timer = StageTimer()
+    # Fresh caches so every stage does real work
+    frame_cache.FRAME_CACHE_DIR = os.path.join(work_dir, 'frames')
+    frame_cache._open_arrays.clear()
+    audio_cache.AUDIO_CACHE_DIR = os.path.join(work_dir, 'audio')
+    audio_cache._open_tracks.clear()
+    subtitle_renderer.clear_cache()
+
+    with timer('model_load'):
+        model_registry.get_model(model_name)
+
+    processor = VideoProcessor(
+        gameplay_path,
+        attention_path,
+        transcript_cache=TranscriptCache(os.path.join(work_dir, 'transcripts')),
+        artifact_store=ArtifactStore(os.path.join(work_dir, 'artifacts')),
+        render_backend=backend,
+        profile=profile
+    )
+    processor.whisper_model_name = model_name
+    processor.vad = vad
+    duration = processor.gameplay.duration
+
+    with timer('audio_extraction'):
+        processor.audio_samples(0, duration)
+
+    with timer('transcription'):
+        processor.transcript()
+
+    with timer('subtitle_rasterization'):
+        processor.generate_subtitles(0, duration)
+
+    output_path = os.path.join(work_dir, 'part.mp4')
+    if backend == 'moviepy':
+        final_video = processor.process_videos(0, duration)
+        fps = final_video.fps or processor.gameplay.fps
+        frames = 0
+        with timer('compositing'):
+            for _ in final_video.iter_frames(fps=fps, dtype='uint8'):
+                frames += 1
+        with timer('encoding'):
+            processor.render_part(0, duration, output_path)
+        # render_part composites again, so report the encoder's share only
+        timer.stages['encoding'] = max(0.0, timer.stages['encoding'] - timer.stages['compositing'])
+        render_seconds = timer.stages['compositing'] + timer.stages['encoding']
+    else:
+        fps = processor.gameplay.fps
+        frames = int(duration * fps)
+        with timer('encoding'):
+            processor.render_part(0, duration, output_path)
+        render_seconds = timer.stages['encoding']
+
+    return {
+        'duration': duration,
+        'frames': frames,
+        'stages': timer.stages,
+        'render_fps': frames / render_seconds if render_seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return a list of stage regressions against a baseline result file"""
+    regressions = []
+    for name, case in results['cases'].items():
+        base_case = baseline.get('cases', {}).get(name)
+        if not base_case:
+            continue
+        for stage, seconds in case['stages'].items():
+            base_seconds = base_case['stages'].get(stage)
+            # Ignore stages too short to time reliably
+            if not base_seconds or base_seconds < 0.05:
+                continue
+            change = (seconds - base_seconds) / base_seconds
+            if change > threshold:
+                regressions.append((name, stage, base_seconds, seconds, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the video render pipeline')
+    parser.add_argument('--resolutions', nargs='+', default=DEFAULT_RESOLUTIONS)
+    parser.add_argument('--durations', nargs='+', type=float, default=DEFAULT_DURATIONS)
+    parser.add_argument('--backend', default='moviepy', choices=['moviepy', 'ffmpeg'])
+    parser.add_argument('--profile', default=None, help='Render profile (draft, balanced, archive)')
+    parser.add_argument('--fixtures', default=os.path.join('cache', 'bench_fixtures'),
+                        help='Folder for the generated clips (reused between runs)')
+    parser.add_argument('--real-whisper', action='store_true',
+                        help='Load the real Whisper model instead of the stub')
+    parser.add_argument('--model', default=model_registry.DEFAULT_MODEL)
+    parser.add_argument('--vad', action='store_true',
+                        help='Gate transcription on detected speech (the fixtures contain none)')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Allowed slowdown per stage before failing (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    model_name = args.model
+    if not args.real_whisper:
+        model_name = 'benchmark-stub'
+        model_registry.register(model_name, StubWhisperModel())
+
+    os.makedirs(args.fixtures, exist_ok=True)
+    attention_path = generate_fixture(
+        os.path.join(args.fixtures, f'attention_{ATTENTION_RESOLUTION}_{ATTENTION_DURATION:g}s.mp4'),
+        ATTENTION_RESOLUTION, ATTENTION_DURATION, with_audio=False
+    )
+
+    results = {
+        'backend': args.backend,
+        'profile': args.profile or render_profiles.DEFAULT_PROFILE,
+        'whisper': args.model if args.real_whisper else 'stub',
+        'vad': args.vad,
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'cases': {},
+    }
+
+    for resolution in args.resolutions:
+        for duration in args.durations:
+            name = f'{resolution}_{duration:g}s'
+            gameplay_path = generate_fixture(
+                os.path.join(args.fixtures, f'gameplay_{name}.mp4'), resolution, duration
+            )
+            work_dir = tempfile.mkdtemp(prefix='bench_')
+            try:
+                case = run_case(gameplay_path, attention_path, work_dir, args.backend, model_name,
+                                args.profile, args.vad)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            results['cases'][name] = case
+
+            stages = '  '.join(f'{stage}={seconds:.2f}s' for stage, seconds in case['stages'].items())
+            render_fps = f"{case['render_fps']:.1f}" if case['render_fps'] else 'n/a'
+            print(f"{name:>18}  {stages}  fps={render_fps}  rss={case['peak_rss_mb']:.0f}MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Stage timings only compare between runs with the same settings
+        mismatched = [key for key in ('backend', 'profile', 'whisper', 'vad')
+                      if key in baseline and baseline[key] != results[key]]
+        if mismatched:
+            print(f"Baseline was run with different {', '.join(mismatched)}; not comparing")
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        for name, stage, before, after, change in regressions:
+            print(f'REGRESSION {name} {stage}: {before:.2f}s -> {after:.2f}s (+{change:.0%})')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
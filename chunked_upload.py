@@ -0,0 +1,218 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+# Size of the reads used when streaming request bodies to disk
+CHUNK_SIZE = 1024 * 1024
+# Sessions untouched for this long (never completed, or completed but never claimed) are removed
+UPLOAD_TTL = float(os.environ.get('UPLOAD_TTL', 24 * 3600))
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Running SHA-256 per upload, keyed by upload id -> (bytes hashed, hash object).
+# Another worker process may have taken earlier chunks, in which case the
+# prefix already on disk is re-hashed once.
+_hashers = {}
+
+
+class UploadError(Exception):
+    """Raised for unknown uploads or chunks that don't continue the upload"""
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, expected):
+        super().__init__(f'Expected chunk at offset {expected}')
+        self.expected = expected
+
+
+def _session_dir(upload_folder, upload_id):
+    if not _UPLOAD_ID.match(upload_id or ''):
+        raise UploadError('Invalid upload id')
+    return os.path.join(upload_folder, upload_id)
+
+
+def _read_meta(session_dir):
+    try:
+        with open(os.path.join(session_dir, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload not found')
+
+
+def _write_meta(session_dir, meta):
+    temp_path = os.path.join(session_dir, 'meta.json.tmp')
+    with open(temp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp_path, os.path.join(session_dir, 'meta.json'))
+
+
+@contextmanager
+def _locked(session_dir, blocking=True):
+    """Hold an exclusive lock on the upload's data file, across processes.
+
+    Only requests for the same upload wait for each other. Yields False
+    instead of waiting when blocking is False and the lock is taken.
+    """
+    with open(os.path.join(session_dir, 'data'), 'ab') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def create(upload_folder, filename, size=None):
+    """Start a resumable upload and return its id"""
+    upload_id = uuid.uuid4().hex
+    session_dir = _session_dir(upload_folder, upload_id)
+    os.makedirs(session_dir)
+    open(os.path.join(session_dir, 'data'), 'wb').close()
+    _write_meta(session_dir, {'filename': filename, 'size': size, 'sha256': None})
+    return upload_id
+
+
+def status(upload_folder, upload_id):
+    """Return the upload's metadata plus how many bytes have been received"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    meta['offset'] = os.path.getsize(os.path.join(session_dir, 'data'))
+    return meta
+
+
+def _hasher_for(upload_id, data_path, offset):
+    entry = _hashers.get(upload_id)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+
+    sha = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha
+
+
+def append(upload_folder, upload_id, offset, stream):
+    """Stream a request body onto the end of an upload.
+
+    offset must equal the bytes already received, so a client that lost a
+    response can ask for status() and resume from there. Returns the new
+    offset.
+    """
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    if meta['sha256'] is not None:
+        raise UploadError('Upload already completed')
+
+    data_path = os.path.join(session_dir, 'data')
+    # A retried chunk waits for the original request, then sees its offset
+    with _locked(session_dir):
+        current = os.path.getsize(data_path)
+        if offset != current:
+            raise OffsetMismatch(current)
+        # Keeps an upload that is still progressing from expiring
+        os.utime(os.path.join(session_dir, 'meta.json'))
+
+        sha = _hasher_for(upload_id, data_path, current)
+        with open(data_path, 'ab') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                f.write(chunk)
+                sha.update(chunk)
+                current += len(chunk)
+
+        if meta['size'] is not None and current > meta['size']:
+            # Roll back the overshoot so the upload can still be resumed
+            with open(data_path, 'r+b') as f:
+                f.truncate(offset)
+            _hashers.pop(upload_id, None)
+            raise UploadError('Chunk runs past the declared upload size')
+
+        _hashers[upload_id] = (current, sha)
+        return current
+
+
+def complete(upload_folder, upload_id):
+    """Finish an upload and return its SHA-256"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    if meta['sha256'] is not None:
+        return meta['sha256']
+
+    data_path = os.path.join(session_dir, 'data')
+    with _locked(session_dir):
+        received = os.path.getsize(data_path)
+        if meta['size'] is not None and received != meta['size']:
+            raise UploadError(f'Upload incomplete: {received} of {meta["size"]} bytes')
+
+        sha = _hasher_for(upload_id, data_path, received)
+        _hashers.pop(upload_id, None)
+
+        meta['sha256'] = sha.hexdigest()
+        _write_meta(session_dir, meta)
+    return meta['sha256']
+
+
+def completed_path(upload_folder, upload_id):
+    """Path and SHA-256 of a completed upload, read in place without claiming it"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    if meta['sha256'] is None:
+        raise UploadError('Upload not completed')
+    return os.path.join(session_dir, 'data'), meta['sha256']
+
+
+def claim(upload_folder, upload_id, destination_dir, secure_name):
+    """Move a completed upload into a job folder; returns (path, sha256)"""
+    session_dir = _session_dir(upload_folder, upload_id)
+    meta = _read_meta(session_dir)
+    if meta['sha256'] is None:
+        raise UploadError('Upload not completed')
+
+    path = os.path.join(destination_dir, secure_name(meta['filename']) or 'upload.mp4')
+    os.replace(os.path.join(session_dir, 'data'), path)
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return path, meta['sha256']
+
+
+def expire(upload_folder, ttl=None):
+    """Remove upload sessions whose meta.json is older than ttl seconds; returns how many"""
+    ttl = UPLOAD_TTL if ttl is None else ttl
+    cutoff = time.time() - ttl
+    removed = 0
+    for upload_id in os.listdir(upload_folder):
+        if not _UPLOAD_ID.match(upload_id):
+            continue
+        session_dir = os.path.join(upload_folder, upload_id)
+        try:
+            if os.path.getmtime(os.path.join(session_dir, 'meta.json')) >= cutoff:
+                continue
+            # Skip sessions a request is writing to right now
+            with _locked(session_dir, blocking=False) as locked:
+                if not locked:
+                    continue
+                shutil.rmtree(session_dir, ignore_errors=True)
+        except OSError:
+            # Not an upload session, or claimed meanwhile
+            continue
+        _hashers.pop(upload_id, None)
+        removed += 1
+    return removed
+
+
+def save_stream(stream, path):
+    """Copy a file-like object to path in chunks, returning its SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            f.write(chunk)
+            sha.update(chunk)
+    return sha.hexdigest()
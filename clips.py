@@ -0,0 +1,57 @@
+from moviepy.video.VideoClip import VideoClip, ImageClip
+
+
+class LoopingClip(VideoClip):
+    """Endless loop over a single clip.
+
+    Global time t reads the source frame at t mod duration, so any stretch of
+    the loop can be taken without concatenating copies of the source. When
+    frames holds the pre-decoded loop (see frame_cache) they are indexed
+    directly instead of going through the clip's reader.
+    """
+
+    def __init__(self, clip, frames=None):
+        self.source = clip
+        self.loop_duration = clip.duration
+        self.frames = frames
+
+        if frames is None:
+            make_frame = lambda t: clip.get_frame(t % self.loop_duration)
+        else:
+            fps = clip.fps
+            frame_count = len(frames)
+            # Same frame rounding as MoviePy's ffmpeg reader
+            make_frame = lambda t: frames[int(fps * (t % self.loop_duration) + 0.00001) % frame_count]
+
+        super().__init__(make_frame=make_frame)
+        self.fps = clip.fps
+
+    def view(self, offset, duration):
+        """Return the part of the loop from global time offset lasting duration"""
+        offset = offset % self.loop_duration
+        return self.fl_time(lambda t: t + offset).set_duration(duration)
+
+
+def fade_factor(t, duration, fade):
+    """Opacity at time t of a clip fading in and out over fade seconds"""
+    if fade <= 0:
+        return 1.0
+    return max(0.0, min(1.0, t / fade, (duration - t) / fade))
+
+
+class SubtitleClip(ImageClip):
+    """Pre-rasterized RGBA subtitle.
+
+    The crossfade in/out is applied by scaling the alpha mask while
+    compositing, so the text bitmap itself is never redrawn.
+    """
+
+    def __init__(self, rgba, duration, fade):
+        super().__init__(rgba[:, :, :3], duration=duration)
+        self.rgba = rgba
+        self.fade = fade
+        alpha = rgba[:, :, 3] / 255.0
+        self.mask = VideoClip(
+            make_frame=lambda t: alpha * fade_factor(t, duration, fade),
+            ismask=True
+        ).set_duration(duration)
@@ -0,0 +1,103 @@
+import numpy as np
+from moviepy.video.VideoClip import VideoClip
+
+from clips import fade_factor
+
+
+def _regions(position, size, canvas_size):
+    """Source and destination slices of a layer placed at position, cropped to the canvas.
+
+    Returns None when the layer falls entirely outside. Positions are
+    truncated to ints the same way MoviePy's blit does.
+    """
+    x, y = int(position[0]), int(position[1])
+    width, height = size
+    canvas_width, canvas_height = canvas_size
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + width, canvas_width), min(y + height, canvas_height)
+    if right <= left or bottom <= top:
+        return None
+    source = (slice(top - y, bottom - y), slice(left - x, right - x))
+    destination = (slice(top, bottom), slice(left, right))
+    return source, destination
+
+
+class _Subtitle:
+    """A subtitle's straight-alpha pixels, cropped to where its alpha is non-zero"""
+
+    def __init__(self, clip, position, canvas_size):
+        rgba = clip.rgba
+        rows = np.flatnonzero(rgba[:, :, 3].any(axis=1))
+        cols = np.flatnonzero(rgba[:, :, 3].any(axis=0))
+        self.start = clip.start
+        self.duration = clip.duration
+        self.fade = clip.fade
+        self.regions = None
+        if len(rows) == 0:
+            return
+
+        rgba = rgba[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        position = (int(position[0]) + cols[0], int(position[1]) + rows[0])
+        self.regions = _regions(position, (rgba.shape[1], rgba.shape[0]), canvas_size)
+        if self.regions is None:
+            return
+
+        source = rgba[self.regions[0]]
+        self.alpha = source[:, :, 3:].astype(np.float32) / 255
+        self.rgb = source[:, :, :3].astype(np.float32)
+
+
+class LayoutClip(VideoClip):
+    """Fixed-layout compositor for opaque layers plus fading subtitles.
+
+    Layer and subtitle placements are resolved to array slices once. Each
+    frame copies the layers into one preallocated buffer and alpha-blends
+    subtitles only inside their own bounding box, so nothing full-frame is
+    allocated or masked per frame. The returned frame is that buffer: it is
+    overwritten by the next get_frame call, so copy it to keep it.
+    """
+
+    def __init__(self, size, layers, subtitles=(), duration=None, background=(0, 0, 0)):
+        width, height = size
+        self.background = np.array(background, dtype=np.uint8)
+        self._buffer = np.empty((height, width, 3), dtype=np.uint8)
+        self._buffer[:] = self.background
+
+        # Later layers are drawn over earlier ones, as in CompositeVideoClip
+        self._layers = []
+        for clip, position in layers:
+            regions = _regions(position, clip.size, size)
+            if regions is not None:
+                self._layers.append((clip,) + regions)
+
+        self._subtitles = [_Subtitle(clip, position, size) for clip, position in subtitles]
+        self._subtitles = [subtitle for subtitle in self._subtitles if subtitle.regions is not None]
+        # Boxes blended into on the last frame, reset before the next one
+        self._dirty = []
+
+        super().__init__(make_frame=self._make_frame, duration=duration)
+        self.size = (width, height)
+
+    def _make_frame(self, t):
+        buffer = self._buffer
+        for destination in self._dirty:
+            buffer[destination] = self.background
+        self._dirty = []
+
+        for clip, source, destination in self._layers:
+            buffer[destination] = clip.get_frame(t)[source]
+
+        for subtitle in self._subtitles:
+            local_t = t - subtitle.start
+            if not 0 <= local_t < subtitle.duration:
+                continue
+            opacity = fade_factor(local_t, subtitle.duration, subtitle.fade)
+            if opacity <= 0:
+                continue
+            source, destination = subtitle.regions
+            region = buffer[destination]
+            alpha = subtitle.alpha * opacity if opacity < 1 else subtitle.alpha
+            region[:] = region + (subtitle.rgb - region) * alpha
+            self._dirty.append(destination)
+
+        return buffer
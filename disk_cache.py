@@ -0,0 +1,66 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to path, renamed onto path on success.
+
+    The rename is atomic, so other processes never open a half-written
+    entry; on failure the temporary file is removed.
+    """
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def touch(path):
+    """Mark an entry as recently used; eviction goes by mtime"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict(directory, max_bytes, suffix='', keep=None):
+    """Remove the least recently used files under directory until it fits max_bytes.
+
+    Only files ending in suffix count, and temporary files being written
+    are skipped, as is keep. Returns the removed paths. Processes that
+    still map a removed file keep reading it; its space is freed once
+    they let go of it.
+    """
+    entries = []
+    total = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(suffix) or '.tmp' in name:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    entries.sort()
+    removed = []
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+    return removed
@@ -0,0 +1,204 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+import render_profiles
+import subtitle_renderer
+
+# ffmpeg binary, overridable for containers that ship their own build
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+
+def _even(value):
+    """libx264 with yuv420p needs even frame dimensions"""
+    value = int(value)
+    return value - (value % 2)
+
+
+def _ass_time(seconds):
+    seconds = max(0.0, seconds)
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f'{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}'
+
+
+def _ass_text(text):
+    # Backslashes and braces are override syntax in ASS; newlines are written as \N
+    text = text.replace('\\', '/').replace('{', '(').replace('}', ')')
+    return text.replace('\n', '\\N')
+
+
+def write_ass(chunks, layout, path, font, fontsize, bold=True, duration=None, line_height=None):
+    """Write subtitle chunks as an ASS file matching the MoviePy subtitle style.
+
+    fontsize is in ASS units (line height, see subtitle_renderer.ass_font_size)
+    and chunk texts are expected already wrapped; libass only breaks at \\N.
+    With line_height each line is placed on its own at that pitch, as the
+    rasterized subtitles stack their line strips, instead of using libass's
+    own line spacing.
+    """
+    subtitle_x = layout['width'] / 2
+    # Wrap inside the same 90% width the rasterized subtitles use
+    margin = int(layout['width'] * 0.05)
+    subtitle_y = layout['subtitle_y']
+    lines = [
+        '[Script Info]',
+        'ScriptType: v4.00+',
+        f"PlayResX: {layout['width']}",
+        f"PlayResY: {layout['height']}",
+        'WrapStyle: 2',
+        'ScaledBorderAndShadow: yes',
+        '',
+        '[V4+ Styles]',
+        'Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, '
+        'Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, '
+        'Shadow, Alignment, MarginL, MarginR, MarginV, Encoding',
+        # White text, 2px black outline, no shadow, top-centre anchored
+        f'Style: Default,{font},{fontsize},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,'
+        f'{-1 if bold else 0},0,0,0,100,100,0,0,1,2,0,8,{margin},{margin},0,1',
+        '',
+        '[Events]',
+        'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text',
+    ]
+    for chunk in chunks:
+        start = chunk['start']
+        end = chunk['start'] + chunk['duration']
+        if duration is not None:
+            end = min(end, duration)
+        if end <= start:
+            continue
+        fade_ms = int(chunk['fade'] * 1000)
+        texts = chunk['text'].split('\n') if line_height else [chunk['text']]
+        for i, text in enumerate(texts):
+            y = subtitle_y + i * (line_height or 0)
+            overrides = f'{{\\pos({subtitle_x:.0f},{y:.0f})\\fad({fade_ms},{fade_ms})}}'
+            lines.append(
+                f'Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,'
+                f'{overrides}{_ass_text(text)}'
+            )
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def _escape_filter_path(path):
+    # Filter arguments treat backslash, colon and quotes as syntax
+    path = os.path.abspath(path).replace('\\', '/')
+    return path.replace(':', '\\:').replace("'", "\\'")
+
+
+def build_filter_graph(layout, subtitles_path=None, fonts_dir=None):
+    """Build the filter_complex string for the output layout.
+
+    Inputs are expected as 0 = gameplay, 1 = looped attention video,
+    2 = black background. The composed video is labelled [v].
+    """
+    gameplay_width, gameplay_height = layout['gameplay_size']
+    gameplay_x, gameplay_y = layout['gameplay_position']
+    attention_width, attention_height = layout['attention_size']
+    attention_x, attention_y = layout['attention_position']
+
+    filters = [
+        f'[0:v]scale={_even(gameplay_width)}:{_even(gameplay_height)}[gameplay]',
+        f'[1:v]scale={_even(attention_width)}:{_even(attention_height)}[attention]',
+        f'[2:v][gameplay]overlay=x={gameplay_x:.0f}:y={gameplay_y:.0f}:eof_action=pass[base]',
+        f'[base][attention]overlay=x={attention_x:.0f}:y={attention_y:.0f}[layers]',
+    ]
+    if subtitles_path:
+        subtitles = f"subtitles='{_escape_filter_path(subtitles_path)}'"
+        if fonts_dir:
+            subtitles += f":fontsdir='{_escape_filter_path(fonts_dir)}'"
+        filters.append(f'[layers]{subtitles}[v]')
+    else:
+        filters.append('[layers]null[v]')
+    return ';'.join(filters)
+
+
+def build_command(processor, start_time, end_time, output_path, subtitles_path=None):
+    """Build the ffmpeg command line rendering one part of processor"""
+    layout = processor.layout()
+    duration = end_time - start_time
+    fps = processor.gameplay.fps or 30
+    # libass only knows system fonts unless pointed at the font file's folder
+    fonts_dir = None
+    if os.path.isfile(processor.subtitle_font):
+        fonts_dir = os.path.dirname(os.path.abspath(processor.subtitle_font))
+    attention_offset = 0
+    if processor.attention_phase == 'continue':
+        attention_offset = start_time % processor.attention.duration
+
+    return [
+        FFMPEG_BINARY, '-y', '-loglevel', 'error',
+        # Gameplay trimmed to the part with an input seek
+        '-ss', f'{start_time:.3f}', '-t', f'{duration:.3f}', '-i', processor.gameplay_path,
+        # Attention video looped forever; the output duration bounds it. The seek
+        # only applies to the first pass, later loops restart from 0
+        '-stream_loop', '-1', '-ss', f'{attention_offset:.3f}', '-i', processor.attention_path,
+        '-f', 'lavfi', '-i', f"color=c=black:s={layout['width']}x{layout['height']}:r={fps}:d={duration:.3f}",
+        '-filter_complex', build_filter_graph(layout, subtitles_path, fonts_dir),
+        '-map', '[v]', '-map', '0:a?',
+        '-t', f'{duration:.3f}',
+        *render_profiles.ffmpeg_args(processor.profile),
+        output_path,
+    ]
+
+
+def run_with_progress(command, on_frame=None):
+    """Run ffmpeg, calling on_frame(frame) as it reports encoded frames"""
+    # Machine-readable key=value progress on stdout; errors go to a temp file so
+    # a chatty stderr can't fill its pipe and stall the encode
+    command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        for line in process.stdout:
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key == 'frame' and on_frame is not None and value.isdigit():
+                on_frame(int(value))
+        process.wait()
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f'ffmpeg failed: {stderr.read().decode(errors="replace").strip()}')
+
+
+def render_part(processor, start_time, end_time, output_path):
+    """Render one part of processor with a single ffmpeg invocation"""
+    instrumentation = processor.instrumentation
+    temp_dir = tempfile.mkdtemp(prefix='subtitles_')
+    try:
+        with instrumentation.stage('compose', part=start_time):
+            chunks = processor.subtitle_chunks(start_time, end_time)
+            subtitles_path = None
+            if chunks:
+                font, fontsize = processor.subtitle_font, processor.subtitle_fontsize
+                family, bold = subtitle_renderer.font_family(font, fontsize)
+                # Same line breaks as the rasterized subtitles
+                width = int(processor.target_width * 0.9)
+                chunks = [dict(chunk, text='\n'.join(subtitle_renderer.wrap_text(chunk['text'], font, fontsize, width)))
+                          for chunk in chunks]
+                subtitles_path = write_ass(
+                    chunks,
+                    processor.layout(),
+                    os.path.join(temp_dir, 'part.ass'),
+                    family,
+                    subtitle_renderer.ass_font_size(font, fontsize),
+                    bold=bold,
+                    duration=end_time - start_time,
+                    line_height=subtitle_renderer.line_height(font, fontsize)
+                )
+
+        total_frames = processor.frame_count(start_time, end_time)
+
+        def on_frame(frame):
+            instrumentation.emit('frames_encoded', part=start_time, frame=min(frame, total_frames),
+                                 total_frames=total_frames)
+
+        command = build_command(processor, start_time, end_time, output_path, subtitles_path)
+        with instrumentation.stage('encode', part=start_time):
+            run_with_progress(command, on_frame if instrumentation.listeners else None)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return output_path
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import disk_cache
+from transcript_cache import file_digest
+
+# Where pre-scaled frame arrays are kept, shared by every job on the host
+FRAME_CACHE_DIR = os.environ.get('FRAME_CACHE_DIR', os.path.join('cache', 'frames'))
+# Loops larger than this are streamed from the reader instead of cached
+FRAME_CACHE_MAX_BYTES = int(os.environ.get('FRAME_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+# Total size of FRAME_CACHE_DIR; least recently used loops are removed past it
+FRAME_CACHE_DIR_MAX_BYTES = int(os.environ.get('FRAME_CACHE_DIR_MAX_BYTES', 8 * 1024 * 1024 * 1024))
+
+# Open memmaps, so jobs in one process share a single mapping per entry
+_open_arrays = {}
+_lock = threading.Lock()
+
+
+def cache_key(source_path, size, fps, variant=None):
+    payload = json.dumps({
+        'source': file_digest(source_path),
+        'size': list(size),
+        'fps': fps,
+        'variant': variant,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_frames(clip, source_path, variant=None):
+    """Return every frame of clip as a read-only memory-mapped array.
+
+    The array is decoded once and stored as .npy under FRAME_CACHE_DIR, so
+    later parts and jobs using the same source and size only map it.
+    Returns None when the decoded loop would exceed FRAME_CACHE_MAX_BYTES,
+    in which case the caller should keep streaming from the clip.
+    """
+    fps = clip.fps
+    width, height = clip.size
+    frame_count = max(1, int(clip.duration * fps))
+    if frame_count * width * height * 3 > FRAME_CACHE_MAX_BYTES:
+        return None
+
+    key = cache_key(source_path, clip.size, fps, variant)
+    path = os.path.join(FRAME_CACHE_DIR, f'{key}.npy')
+    with _lock:
+        if key in _open_arrays:
+            disk_cache.touch(path)
+            return _open_arrays[key]
+
+        os.makedirs(FRAME_CACHE_DIR, exist_ok=True)
+        if os.path.exists(path):
+            disk_cache.touch(path)
+        else:
+            _build(clip, path, frame_count, fps)
+            for evicted in disk_cache.evict(FRAME_CACHE_DIR, FRAME_CACHE_DIR_MAX_BYTES, '.npy', keep=path):
+                # Drop this process's mapping too so the space is actually freed
+                _open_arrays.pop(os.path.basename(evicted)[:-len('.npy')], None)
+
+        frames = np.load(path, mmap_mode='r')
+        _open_arrays[key] = frames
+        return frames
+
+
+def _build(clip, path, frame_count, fps):
+    """Decode and scale one full loop of clip into a .npy file"""
+    first = clip.get_frame(0)
+    with disk_cache.atomic_path(path) as temp_path:
+        frames = np.lib.format.open_memmap(
+            temp_path, mode='w+', dtype=np.uint8, shape=(frame_count,) + first.shape
+        )
+        frames[0] = first
+        for i in range(1, frame_count):
+            frames[i] = clip.get_frame(i / fps)
+        frames.flush()
+        del frames
@@ -0,0 +1,30 @@
+"""Gunicorn settings for the web app.
+
+The app is imported once in the master (preload_app), so the workers share
+its imported modules copy-on-write. Whisper is loaded in each worker after
+the fork instead: torch's thread pools don't survive a fork, so the master
+never touches it unless WHISPER_WARMUP is set explicitly. Render worker
+threads are only started inside each worker, on its first request.
+"""
+import gc
+import os
+import threading
+
+preload_app = True
+
+# Load the default Whisper model in every worker as it starts, rather than on the first job
+WORKER_WHISPER_WARMUP = os.environ.get('WORKER_WHISPER_WARMUP', '1').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    # Everything built while preloading is long-lived; freezing it keeps the
+    # garbage collector from writing to (and so copying) those pages in workers
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if WORKER_WHISPER_WARMUP:
+        import model_registry
+        # In the background so a slow load doesn't trip the worker boot timeout;
+        # a job that needs the model meanwhile waits on the registry lock
+        threading.Thread(target=model_registry.warm_up, name='whisper-warmup', daemon=True).start()
\ No newline at end of file
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+from proglog import ProgressBarLogger
+
+# Histogram buckets for per-stage latency, in seconds
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class Instrumentation:
+    """Structured event emitter for the render pipeline.
+
+    Listeners are called as listener(event, fields) for events such as
+    stage_start, stage_end, frames_encoded, transcription_progress and
+    bytes_written. With no listeners every call is a cheap no-op.
+    """
+
+    def __init__(self, listeners=None):
+        self.listeners = list(listeners or [])
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def emit(self, event, **fields):
+        for listener in self.listeners:
+            listener(event, fields)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Emit stage_start/stage_end around a block, with the elapsed seconds"""
+        self.emit('stage_start', stage=name, **fields)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.emit('stage_end', stage=name, seconds=time.perf_counter() - start, **fields)
+
+    def frame_logger(self, **fields):
+        """A MoviePy logger that reports every encoded frame"""
+        return FrameProgressLogger(self, **fields)
+
+
+class FrameProgressLogger(ProgressBarLogger):
+    """Forwards MoviePy's frame iteration ('t' bar) as frames_encoded events"""
+
+    def __init__(self, instrumentation, **fields):
+        super().__init__()
+        self.instrumentation = instrumentation
+        self.fields = fields
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == 't' and attr == 'index':
+            self.instrumentation.emit(
+                'frames_encoded',
+                frame=value + 1,
+                total_frames=self.bars[bar]['total'],
+                **self.fields
+            )
+
+
+class StageMetrics:
+    """Per-stage latency histograms kept in SQLite.
+
+    Renders run in whichever gunicorn worker claimed the job, so the
+    histograms live next to the job table where any worker can export them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_metrics (
+                    stage TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    value REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (stage, bucket)
+                )
+            """)
+
+    def _connect(self):
+        # sqlite3's own context manager only commits, so close the connection explicitly
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def observe(self, stage, seconds):
+        rows = [(stage, str(bound), 1) for bound in STAGE_BUCKETS if seconds <= bound]
+        rows += [(stage, '+Inf', 1), (stage, 'count', 1), (stage, 'sum', seconds)]
+        with self._lock, self._connect() as conn, conn:
+            conn.executemany("""
+                INSERT INTO stage_metrics (stage, bucket, value) VALUES (?, ?, ?)
+                ON CONFLICT (stage, bucket) DO UPDATE SET value = value + excluded.value
+            """, rows)
+
+    def listener(self, event, fields):
+        """Instrumentation listener recording every finished stage"""
+        if event == 'stage_end':
+            self.observe(fields['stage'], fields['seconds'])
+
+    def prometheus_lines(self, name='video_stage_seconds'):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT stage, bucket, value FROM stage_metrics').fetchall()
+
+        stages = {}
+        for stage, bucket, value in rows:
+            stages.setdefault(stage, {})[bucket] = value
+
+        lines = [
+            f'# HELP {name} Time spent in each render pipeline stage.',
+            f'# TYPE {name} histogram',
+        ]
+        for stage in sorted(stages):
+            values = stages[stage]
+            for bound in STAGE_BUCKETS:
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {values.get(str(bound), 0):.0f}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {values.get("+Inf", 0):.0f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {values.get("sum", 0):.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {values.get("count", 0):.0f}')
+        return lines
+
+
+class ProgressTracker:
+    """Turns frames_encoded events into overall progress and an ETA.
+
+    report(progress=..., eta=..., frames_done=..., frames_total=...) is
+    called at most every min_interval seconds, and once more on the last
+    frame of a part.
+    """
+
+    def __init__(self, frames_total, report, min_interval=0.5):
+        self.frames_total = max(1, frames_total)
+        self.report = report
+        self.min_interval = min_interval
+        self.started = time.monotonic()
+        self._part_frames = {}
+        self._last_report = 0
+        self._lock = threading.Lock()
+
+    def listener(self, event, fields):
+        if event != 'frames_encoded':
+            return
+        with self._lock:
+            self._part_frames[fields.get('part')] = fields['frame']
+            frames_done = min(sum(self._part_frames.values()), self.frames_total)
+
+            now = time.monotonic()
+            finished_part = fields['frame'] >= fields.get('total_frames', 0)
+            if not finished_part and now - self._last_report < self.min_interval:
+                return
+            self._last_report = now
+
+        elapsed = now - self.started
+        eta = None
+        if frames_done:
+            eta = elapsed / frames_done * (self.frames_total - frames_done)
+        self.report(
+            progress=frames_done / self.frames_total * 100,
+            eta=eta,
+            frames_done=frames_done,
+            frames_total=self.frames_total
+        )
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
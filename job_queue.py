@@ -0,0 +1,264 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Job database shared by every gunicorn worker on the host
+JOBS_DB = os.environ.get('JOBS_DB', 'jobs.sqlite3')
+# Maximum number of jobs rendering at once across all workers
+RENDER_CONCURRENCY = int(os.environ.get('RENDER_CONCURRENCY', 1))
+# Maximum number of jobs waiting before /upload starts returning 429
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 20))
+# Seconds an idle render worker waits before checking for new jobs
+POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+
+
+# Frame-accurate progress reported while a job renders
+PROGRESS_COLUMNS = (
+    ('eta', 'REAL'),
+    ('frames_done', 'INTEGER NOT NULL DEFAULT 0'),
+    ('frames_total', 'INTEGER NOT NULL DEFAULT 0'),
+    # Memory estimate a processing job was admitted with
+    ('memory_reserved', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobStore:
+    """SQLite-backed job table readable from any process"""
+
+    def __init__(self, path=None):
+        self.path = path or JOBS_DB
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    files TEXT NOT NULL DEFAULT '[]',
+                    error TEXT,
+                    params TEXT NOT NULL,
+                    worker_pid INTEGER,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+            # Columns added after the first release
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for name, definition in PROGRESS_COLUMNS:
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {definition}')
+
+    def _connect(self):
+        # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _closing(conn)
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['files'] = json.loads(job['files'])
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def count(self, status):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (status,)).fetchone()[0]
+
+    def counts(self):
+        """Number of jobs in each status"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def create(self, job_id, params, max_queued=None):
+        """Insert a queued job, raising QueueFull if too many are already waiting"""
+        max_queued = MAX_QUEUED_JOBS if max_queued is None else max_queued
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFull(f'{queued} jobs already queued')
+                conn.execute(
+                    "INSERT INTO jobs (id, status, params, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(params), now, now)
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def claim(self, concurrency=None, admit=None):
+        """Atomically move the oldest queued job to processing and return it.
+
+        Returns None when nothing is queued or the global concurrency limit
+        is already reached. With admit, the job is only claimed when
+        admit(params, reserved) returns its memory estimate rather than None,
+        where reserved is the total estimate of every processing job.
+        """
+        concurrency = RENDER_CONCURRENCY if concurrency is None else concurrency
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running, reserved = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(memory_reserved), 0) FROM jobs WHERE status = 'processing'"
+                ).fetchone()
+                row = None
+                if running < concurrency:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                    ).fetchone()
+                estimate = 0
+                if row is not None and admit is not None:
+                    estimate = admit(json.loads(row['params']), reserved)
+                    if estimate is None:
+                        # Stays first in line until running jobs free memory
+                        row = None
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'processing', worker_pid = ?, memory_reserved = ?, "
+                        "updated_at = ? WHERE id = ?",
+                        (os.getpid(), estimate, time.time(), row['id'])
+                    )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        job['status'] = 'processing'
+        job['memory_reserved'] = estimate
+        return job
+
+    def update(self, job_id, **fields):
+        if 'files' in fields:
+            fields['files'] = json.dumps(fields['files'])
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def reserved_memory(self):
+        """Total memory estimate of the jobs processing on the host"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(memory_reserved), 0) FROM jobs WHERE status = 'processing'"
+            ).fetchone()[0]
+
+    def fail_orphaned(self):
+        """Mark jobs whose worker process has died as failed"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'processing'").fetchall()
+        for row in rows:
+            if row['worker_pid'] and not _pid_alive(row['worker_pid']):
+                self.update(row['id'], status='failed', error='Render worker exited unexpectedly')
+
+
+class JobQueue:
+    """Pool of background render threads pulling jobs from a JobStore.
+
+    Every process that serves requests runs its own threads, but the
+    concurrency limit is enforced by the store so the total number of
+    renders on the host never exceeds it.
+
+    With a scheduler, the oldest queued job is only claimed once
+    scheduler.admits(estimate(params), reserved) lets it in next to the jobs
+    already processing in any process; otherwise it waits at the head of
+    the queue until memory frees up.
+    """
+
+    def __init__(self, store, handler, concurrency=None, scheduler=None, estimate=None):
+        self.store = store
+        self.handler = handler
+        self.concurrency = RENDER_CONCURRENCY if concurrency is None else concurrency
+        self.scheduler = scheduler
+        self.estimate = estimate
+        self._started_pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the render threads once per process (safe to call repeatedly)"""
+        with self._lock:
+            # Threads don't survive a fork, so track the process that started them
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self.store.fail_orphaned()
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._worker_loop, name=f'render-worker-{i}', daemon=True)
+                thread.start()
+
+    def submit(self, job_id, params):
+        self.store.create(job_id, params)
+        self.start()
+
+    def _worker_loop(self):
+        while True:
+            admit = None
+            if self.scheduler is not None and self.estimate is not None:
+                admit = self._admit
+            try:
+                job = self.store.claim(self.concurrency, admit)
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            # The reservation ends with the job leaving the processing status
+            self._run(job)
+
+    def _admit(self, params, reserved):
+        estimate = self.estimate(params)
+        return estimate if self.scheduler.admits(estimate, reserved) else None
+
+    def _run(self, job):
+        job_id = job['id']
+
+        def report(**fields):
+            self.store.update(job_id, **fields)
+
+        try:
+            self.handler(job, report)
+            self.store.update(job_id, status='completed', progress=100, eta=0)
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e))
+
+
+class _closing:
+    """Context manager that closes the connection (sqlite3's own one only commits)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc_info):
+        self.conn.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -1,11 +1,21 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from video_processor import VideoProcessor
-from moviepy.editor import VideoFileClip
-import numpy as np
+from video_processor import VideoProcessor, RENDER_BACKEND, RENDER_BACKENDS
+from parallel_render import render_parts, RENDER_WORKERS
+from instrumentation import ProgressTracker
+import stream_split
+import render_profiles
+import math
 import os
+import threading
 from datetime import timedelta
 
+# Where rendered parts go; one folder per gameplay video is created inside
+OUTPUT_DIR = os.environ.get(
+    'VIDEO_OUTPUT_DIR',
+    os.path.join(os.path.expanduser("~"), "OneDrive", "Работен плот", "TIKTOK")
+)
+
 class VideoProcessorGUI:
     def __init__(self, root):
         self.root = root
@@ -70,6 +80,29 @@ class VideoProcessorGUI:
         self.parts_entry.grid(row=2, column=1, padx=5, pady=5)
         self.parts_entry.bind('<KeyRelease>', lambda e: self.update_preview())
         
+        # Number of parts encoded at the same time
+        ttk.Label(split_frame, text="Parallel renders", style='Modern.TLabel').grid(row=3, column=0, pady=5)
+        self.workers_var = tk.IntVar(value=RENDER_WORKERS)
+        ttk.Spinbox(split_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.workers_var,
+                    width=13).grid(row=3, column=1, padx=5, pady=5)
+        
+        # Render backend (MoviePy compositing or a single ffmpeg filter graph)
+        ttk.Label(split_frame, text="Renderer", style='Modern.TLabel').grid(row=4, column=0, pady=5)
+        self.backend_var = tk.StringVar(value=RENDER_BACKEND)
+        ttk.Combobox(split_frame, textvariable=self.backend_var, values=RENDER_BACKENDS,
+                     state='readonly', width=12).grid(row=4, column=1, padx=5, pady=5)
+        
+        # Encoder profile applied to every part
+        ttk.Label(split_frame, text="Output profile", style='Modern.TLabel').grid(row=5, column=0, pady=5)
+        self.profile_var = tk.StringVar(value=render_profiles.DEFAULT_PROFILE)
+        ttk.Combobox(split_frame, textvariable=self.profile_var, values=list(render_profiles.PROFILES),
+                     state='readonly', width=12).grid(row=5, column=1, padx=5, pady=5)
+        
+        # Stream copy split: gameplay only, cut on keyframes without re-encoding
+        self.copy_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(split_frame, text="Fast split only (stream copy, no overlay)", variable=self.copy_var,
+                        command=self.update_preview).grid(row=6, column=0, columnspan=2, pady=5)
+        
         # Preview section
         preview_frame = ttk.LabelFrame(self.main_frame, text="Preview", padding="10")
         preview_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 20))
@@ -77,6 +110,9 @@ class VideoProcessorGUI:
         self.preview_label = ttk.Label(preview_frame, text="", style='Preview.TLabel', wraplength=700)
         self.preview_label.grid(row=0, column=0, pady=5)
         
+        ttk.Button(preview_frame, text="Preview", command=self.show_layout_preview,
+                   style='Modern.TButton').grid(row=1, column=0, pady=5)
+        
         # Process button
         ttk.Button(self.main_frame, text="Process Videos", command=self.process_videos, 
                   style='Modern.TButton').grid(row=4, column=0, columnspan=2, pady=10)
@@ -88,12 +124,46 @@ class VideoProcessorGUI:
     def format_time(self, seconds):
         return str(timedelta(seconds=int(seconds)))
 
+    def split_value(self, split_option):
+        """Entry value for the chosen split option (raises ValueError if invalid)"""
+        if split_option == "duration":
+            value = float(self.duration_entry.get())
+        elif split_option == "parts":
+            value = int(self.parts_entry.get())
+        else:
+            return None
+        if value <= 0:
+            raise ValueError("Value must be positive")
+        return value
+
+    def preview_copy_split(self, split_option):
+        """Show the part boundaries after snapping the cuts to keyframes"""
+        try:
+            ranges = stream_split.plan_ranges(self.gameplay_path, split_option, self.split_value(split_option))
+        except ValueError:
+            self.preview_label.config(text="Please enter a valid number")
+            return
+        except RuntimeError as e:
+            self.preview_label.config(text=f"Could not read keyframes: {e}")
+            return
+        
+        lines = [f"This will create {len(ranges)} videos, cut on keyframes:"]
+        for i, (start, end) in enumerate(ranges[:12], 1):
+            lines.append(f"Part {i}: {self.format_time(start)} - {self.format_time(end)} ({end - start:.1f}s)")
+        if len(ranges) > 12:
+            lines.append(f"... and {len(ranges) - 12} more")
+        self.preview_label.config(text="\n".join(lines))
+
     def update_preview(self):
         if not self.gameplay_path:
             self.preview_label.config(text="Please select videos first")
             return
             
         split_option = self.split_var.get()
+        if self.copy_var.get():
+            self.preview_copy_split(split_option)
+            return
+        
         if split_option == "none":
             self.preview_label.config(text=f"Final video duration: {self.format_time(self.gameplay_duration)}")
             
@@ -104,7 +174,7 @@ class VideoProcessorGUI:
                     self.preview_label.config(text="Please enter a valid duration")
                     return
                     
-                num_parts = int(np.ceil(self.gameplay_duration / duration))
+                num_parts = math.ceil(self.gameplay_duration / duration)
                 last_part_duration = self.gameplay_duration % duration or duration
                 
                 preview_text = f"This will create {num_parts} videos of {self.format_time(duration)} each"
@@ -135,6 +205,7 @@ class VideoProcessorGUI:
         if self.gameplay_path:
             self.gameplay_label.config(text=os.path.basename(self.gameplay_path))
             # Get video duration
+            from moviepy.video.io.VideoFileClip import VideoFileClip
             temp_clip = VideoFileClip(self.gameplay_path)
             self.gameplay_duration = temp_clip.duration
             temp_clip.close()
@@ -146,34 +217,119 @@ class VideoProcessorGUI:
             self.attention_label.config(text=os.path.basename(self.attention_path))
             self.update_preview()
 
+    def show_layout_preview(self):
+        """Render a few low-resolution stills of the first seconds and show them"""
+        if not self.gameplay_path or not self.attention_path:
+            self.status_label.config(text="Please select both videos first!")
+            return
+        
+        self.status_label.config(text="Rendering preview...")
+        self.root.update()
+        try:
+            with VideoProcessor(self.gameplay_path, self.attention_path) as processor:
+                image = processor.preview()
+        except Exception as e:
+            self.status_label.config(text=f"Error: {e}")
+            messagebox.showerror("Error", str(e))
+            return
+        
+        from PIL import ImageTk
+        window = tk.Toplevel(self.root)
+        window.title("Layout preview")
+        photo = ImageTk.PhotoImage(image)
+        label = ttk.Label(window, image=photo)
+        label.image = photo  # Tk doesn't hold a reference to the image
+        label.pack()
+        self.status_label.config(text="")
+
+    def render_ranges(self, processor, ranges, output_dir):
+        output_paths = [os.path.join(output_dir, f"part {i}.mp4") for i in range(1, len(ranges) + 1)]
+        
+        def on_part_done(completed, total, output_path):
+            self.status_label.config(text=f"Finished part {completed} of {total}...")
+            self.root.update()
+        
+        def on_progress(progress, eta, frames_done, frames_total):
+            # Parallel renders report from a forwarding thread; Tk may only be touched here
+            if threading.current_thread() is not threading.main_thread():
+                return
+            text = f"Encoding frame {frames_done} of {frames_total} ({progress:.0f}%)"
+            if eta is not None:
+                text += f", about {self.format_time(eta)} left"
+            self.status_label.config(text=text)
+            self.root.update()
+        
+        frames_total = sum(processor.frame_count(start, end) for start, end in ranges)
+        processor.instrumentation.add_listener(ProgressTracker(frames_total, on_progress).listener)
+        
+        try:
+            workers = max(1, self.workers_var.get())
+        except tk.TclError:
+            workers = 1
+        
+        return render_parts(processor, ranges, output_paths, workers=workers,
+                            progress_callback=on_part_done)
+
+    def output_dir(self):
+        # Get the base name of the gameplay video (without extension)
+        video_name = os.path.splitext(os.path.basename(self.gameplay_path))[0]
+        
+        # Create main TIKTOK directory if it doesn't exist
+        tiktok_dir = OUTPUT_DIR
+        if not os.path.exists(tiktok_dir):
+            os.makedirs(tiktok_dir)
+        
+        # Create a folder for this video
+        output_dir = os.path.join(tiktok_dir, video_name)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        return output_dir
+
+    def fast_split(self):
+        split_option = self.split_var.get()
+        try:
+            ranges = stream_split.plan_ranges(self.gameplay_path, split_option, self.split_value(split_option))
+        except ValueError:
+            self.status_label.config(text="Please enter a valid positive number!")
+            return
+        
+        output_dir = self.output_dir()
+        extension = os.path.splitext(self.gameplay_path)[1]
+        output_paths = [os.path.join(output_dir, f"part {i}{extension}") for i in range(1, len(ranges) + 1)]
+        
+        def on_part_done(completed, total, output_path):
+            self.status_label.config(text=f"Copied part {completed} of {total}...")
+            self.root.update()
+        
+        stream_split.copy_split(self.gameplay_path, ranges, output_paths, progress_callback=on_part_done)
+        self.status_label.config(text=f"Created {len(ranges)} videos in {output_dir}")
+        messagebox.showinfo("Success", f"Created {len(ranges)} videos in {output_dir}")
+
     def process_videos(self):
+        if self.copy_var.get() and self.gameplay_path:
+            try:
+                self.fast_split()
+            except Exception as e:
+                self.status_label.config(text=f"Error: {e}")
+                messagebox.showerror("Error", str(e))
+            return
+        
         if not self.gameplay_path or not self.attention_path:
             self.status_label.config(text="Please select both videos first!")
             return
         
+        processor = None
         try:
-            processor = VideoProcessor(self.gameplay_path, self.attention_path)
+            processor = VideoProcessor(self.gameplay_path, self.attention_path,
+                                       render_backend=self.backend_var.get(),
+                                       profile=self.profile_var.get())
             split_option = self.split_var.get()
-            
-            # Get the base name of the gameplay video (without extension)
-            video_name = os.path.splitext(os.path.basename(self.gameplay_path))[0]
-            
-            # Create main TIKTOK directory if it doesn't exist
-            tiktok_dir = os.path.join(os.path.expanduser("~"), "OneDrive", "Работен плот", "TIKTOK")
-            if not os.path.exists(tiktok_dir):
-                os.makedirs(tiktok_dir)
-            
-            # Create a folder for this video
-            output_dir = os.path.join(tiktok_dir, video_name)
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
+            output_dir = self.output_dir()
             
             if split_option == "none":
                 self.status_label.config(text="Processing video...")
                 self.root.update()
-                final_video = processor.process_videos()
-                output_path = os.path.join(output_dir, "part 1.mp4")
-                final_video.write_videofile(output_path)
+                output_path, = self.render_ranges(processor, [(0, processor.gameplay.duration)], output_dir)
                 self.status_label.config(text=f"Video saved to {output_path}")
                 
             elif split_option == "duration":
@@ -184,16 +340,11 @@ class VideoProcessorGUI:
                     
                     self.status_label.config(text="Processing videos...")
                     self.root.update()
-                    parts = processor.split_by_duration(duration)
-                    
-                    for i, part in enumerate(parts, 1):
-                        self.status_label.config(text=f"Processing part {i} of {len(parts)}...")
-                        self.root.update()
-                        output_path = os.path.join(output_dir, f"part {i}.mp4")
-                        part.write_videofile(output_path)
+                    ranges = processor.part_ranges(duration)
+                    self.render_ranges(processor, ranges, output_dir)
                     
-                    self.status_label.config(text=f"Created {len(parts)} videos in {output_dir}")
-                    messagebox.showinfo("Success", f"Created {len(parts)} videos in {output_dir}")
+                    self.status_label.config(text=f"Created {len(ranges)} videos in {output_dir}")
+                    messagebox.showinfo("Success", f"Created {len(ranges)} videos in {output_dir}")
                     
                 except ValueError as e:
                     self.status_label.config(text="Please enter a valid positive duration!")
@@ -206,13 +357,8 @@ class VideoProcessorGUI:
                     
                     self.status_label.config(text="Processing videos...")
                     self.root.update()
-                    parts = processor.split_by_parts(num_parts)
-                    
-                    for i, part in enumerate(parts, 1):
-                        self.status_label.config(text=f"Processing part {i} of {num_parts}...")
-                        self.root.update()
-                        output_path = os.path.join(output_dir, f"part {i}.mp4")
-                        part.write_videofile(output_path)
+                    ranges = processor.part_ranges_for_count(num_parts)
+                    self.render_ranges(processor, ranges, output_dir)
                     
                     self.status_label.config(text=f"Created {num_parts} videos in {output_dir}")
                     messagebox.showinfo("Success", f"Created {num_parts} videos in {output_dir}")
@@ -224,6 +370,9 @@ class VideoProcessorGUI:
             error_msg = str(e)
             self.status_label.config(text=f"Error: {error_msg}")
             messagebox.showerror("Error", error_msg)
+        finally:
+            if processor is not None:
+                processor.close()
 
 def main():
     root = tk.Tk()
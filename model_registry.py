@@ -0,0 +1,72 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Default model and how many distinct models a process may keep resident
+DEFAULT_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+MAX_RESIDENT_MODELS = int(os.environ.get('WHISPER_MAX_RESIDENT_MODELS', 1))
+
+_models = OrderedDict()
+# Keys loaded with pinned=True; they don't count towards MAX_RESIDENT_MODELS
+_pinned = set()
+_lock = threading.Lock()
+
+
+def _resolve_device(device):
+    if device is not None:
+        return device
+    return os.environ.get('WHISPER_DEVICE') or None
+
+
+def get_model(name=None, device=None, pinned=False):
+    """Return a shared Whisper model, loading it on first use.
+
+    Models are keyed by (name, device). When more than MAX_RESIDENT_MODELS
+    are loaded the least recently used one is dropped. Pinned models (small
+    helpers such as the preview model) are kept outside that budget, so
+    loading one never evicts the model jobs use.
+    """
+    name = name or DEFAULT_MODEL
+    device = _resolve_device(device)
+    key = (name, device)
+
+    # Loading under the lock keeps concurrent jobs from loading duplicates
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key]
+
+        import whisper
+        model = whisper.load_model(name, device=device)
+        _models[key] = model
+        if pinned:
+            _pinned.add(key)
+
+        evictable = [loaded for loaded in _models if loaded not in _pinned]
+        while len(evictable) > max(1, MAX_RESIDENT_MODELS):
+            del _models[evictable.pop(0)]
+
+        return model
+
+
+def register(name, model, device=None):
+    """Install an already-built model (e.g. a stub for benchmarks) under name"""
+    with _lock:
+        _models[(name, _resolve_device(device))] = model
+
+
+def warm_up(names=None, device=None):
+    """Load models ahead of the first request"""
+    for name in names or [DEFAULT_MODEL]:
+        get_model(name, device)
+
+
+def loaded_models():
+    with _lock:
+        return list(_models.keys())
+
+
+def clear():
+    with _lock:
+        _models.clear()
+        _pinned.clear()
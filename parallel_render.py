@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from transcript_cache import remember_digest
+
+# Number of parts encoded at once; 1 keeps the old sequential behaviour
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 1))
+
+# Each worker process keeps its own VideoProcessor (and so its own readers)
+_worker_processor = None
+
+
+def _get_worker_processor(gameplay_path, attention_path, options):
+    global _worker_processor
+    options = dict(options)
+    for path, digest in options.pop('digests', {}).items():
+        remember_digest(path, digest)
+    if (_worker_processor is None
+            or _worker_processor.gameplay_path != gameplay_path
+            or _worker_processor.attention_path != attention_path
+            or _worker_processor.render_options() != options):
+        from video_processor import VideoProcessor
+        if _worker_processor is not None:
+            # Don't leave the previous job's ffmpeg readers running
+            _worker_processor.close()
+        _worker_processor = VideoProcessor(gameplay_path, attention_path, **options)
+    return _worker_processor
+
+
+def render_part_worker(gameplay_path, attention_path, options, start_time, end_time, output_path,
+                       events=None):
+    """Render one part in a worker process; options come from processor.worker_options()"""
+    processor = _get_worker_processor(gameplay_path, attention_path, options)
+    # Stage and frame events go back to the parent through the manager queue
+    processor.instrumentation.listeners = []
+    if events is not None:
+        processor.instrumentation.add_listener(lambda event, fields: events.put((event, fields)))
+    processor.render_part(start_time, end_time, output_path)
+    return output_path
+
+
+def render_parts(processor, ranges, output_paths, workers=None, progress_callback=None):
+    """Render each (start, end) range of processor to the matching output path.
+
+    With more than one worker the parts are encoded concurrently in separate
+    processes. Parts are submitted one at a time as encode slots of the
+    processor's scheduler free up, so concurrent jobs share one encode limit.
+    progress_callback(completed, total, output_path) is called as each part
+    finishes; the returned list of paths is always in part order.
+    """
+    total = len(ranges)
+    workers = min(workers or RENDER_WORKERS, total)
+
+    if workers <= 1:
+        for i, ((start_time, end_time), output_path) in enumerate(zip(ranges, output_paths), 1):
+            processor.render_part(start_time, end_time, output_path)
+            if progress_callback:
+                progress_callback(i, total, output_path)
+        return list(output_paths)
+
+    # Transcribe here first so every worker finds the transcript in the cache
+    processor.transcript()
+
+    # Spawn rather than fork: ffmpeg reader pipes and torch threads don't survive fork
+    context = multiprocessing.get_context('spawn')
+
+    manager = events = forwarder = None
+    if processor.instrumentation.listeners:
+        manager = context.Manager()
+        events = manager.Queue()
+        forwarder = threading.Thread(target=_forward_events, args=(events, processor.instrumentation),
+                                     daemon=True)
+        forwarder.start()
+
+    slots = processor.scheduler.encode_slots
+    parts = iter(enumerate(zip(ranges, output_paths)))
+    results = [None] * total
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = {}
+            completed = 0
+            while completed < total:
+                # Keep at most one part per worker in flight, each holding an encode slot
+                for i, ((start_time, end_time), output_path) in parts:
+                    slots.acquire()
+                    future = pool.submit(
+                        render_part_worker,
+                        processor.gameplay_path,
+                        processor.attention_path,
+                        processor.worker_options(),
+                        start_time,
+                        end_time,
+                        output_path,
+                        events
+                    )
+                    future.add_done_callback(lambda _: slots.release())
+                    pending[future] = i
+                    if len(pending) >= workers:
+                        break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    results[index] = future.result()
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total, results[index])
+    finally:
+        if manager is not None:
+            events.put(None)
+            forwarder.join()
+            manager.shutdown()
+
+    return results
+
+
+def _forward_events(events, instrumentation):
+    """Re-emit worker events in the parent until the None sentinel arrives"""
+    while True:
+        item = events.get()
+        if item is None:
+            return
+        event, fields = item
+        instrumentation.emit(event, **fields)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+# Named output profiles shared by every render backend
+PROFILES = {
+    # Fast CPU previews: fastest x264 preset, lower quality
+    'draft': {
+        'codec': 'libx264',
+        'preset': 'ultrafast',
+        'crf': 30,
+        'threads': os.cpu_count() or 1,
+        'audio_bitrate': '96k',
+        'pixel_format': 'yuv420p',
+    },
+    'balanced': {
+        'codec': 'libx264',
+        'preset': 'medium',
+        'crf': 23,
+        'threads': os.cpu_count() or 1,
+        'audio_bitrate': '128k',
+        'pixel_format': 'yuv420p',
+    },
+    # Slow, high quality masters
+    'archive': {
+        'codec': 'libx264',
+        'preset': 'slow',
+        'crf': 18,
+        'threads': os.cpu_count() or 1,
+        'audio_bitrate': '192k',
+        'pixel_format': 'yuv420p',
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get('RENDER_PROFILE', 'balanced')
+
+# Folder for MoviePy's temporary audio track; unset picks RAM_TEMP_DIR when the
+# track fits there, the system temp folder otherwise
+TEMP_AUDIO_DIR = os.environ.get('TEMP_AUDIO_DIR')
+RAM_TEMP_DIR = '/dev/shm'
+# Free space left in RAM_TEMP_DIR for parts encoding at the same time (Docker's is only 64 MB)
+RAM_TEMP_RESERVE_BYTES = int(os.environ.get('RAM_TEMP_RESERVE_BYTES', 16 * 1024 * 1024))
+
+
+def get_profile(name=None):
+    """Return the settings of a named profile"""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown render profile: {name}")
+    return PROFILES[name]
+
+
+def _bits_per_second(bitrate):
+    """'192k' -> 192000"""
+    multiplier = {'k': 1000, 'm': 1000 * 1000}.get(bitrate[-1].lower(), 1)
+    return float(bitrate.rstrip('kKmM')) * multiplier
+
+
+def temp_audio_dir(duration=None, audio_bitrate='128k'):
+    """Where to write a temporary audio track of duration seconds.
+
+    tmpfs when it has room for the track (with some margin for concurrent
+    parts), so the track never touches the disk; the system temp folder
+    when it doesn't or the duration is unknown.
+    """
+    if TEMP_AUDIO_DIR:
+        return TEMP_AUDIO_DIR
+    if duration is not None and os.path.isdir(RAM_TEMP_DIR):
+        # AAC at a constant bitrate, plus container overhead
+        needed = duration * _bits_per_second(audio_bitrate) / 8 * 1.1
+        try:
+            free = shutil.disk_usage(RAM_TEMP_DIR).free
+        except OSError:
+            free = 0
+        if free - needed >= RAM_TEMP_RESERVE_BYTES:
+            return RAM_TEMP_DIR
+    return tempfile.gettempdir()
+
+
+def moviepy_options(name=None, duration=None):
+    """Keyword arguments for MoviePy's write_videofile.
+
+    MoviePy always muxes audio from a temporary file; for a part of
+    duration seconds it goes to temp_audio_dir(), tmpfs when there's room.
+    """
+    profile = get_profile(name)
+    audio_dir = temp_audio_dir(duration, profile['audio_bitrate'])
+    return {
+        'codec': profile['codec'],
+        'preset': profile['preset'],
+        'threads': profile['threads'],
+        'audio_codec': 'aac',
+        'audio_bitrate': profile['audio_bitrate'],
+        'ffmpeg_params': ['-crf', str(profile['crf']), '-pix_fmt', profile['pixel_format']],
+        'temp_audiofile': os.path.join(audio_dir, f'audio_{uuid.uuid4().hex}.m4a'),
+    }
+
+
+def ffmpeg_args(name=None):
+    """Output encoding arguments for a direct ffmpeg command line"""
+    profile = get_profile(name)
+    return [
+        '-c:v', profile['codec'],
+        '-preset', profile['preset'],
+        '-crf', str(profile['crf']),
+        '-threads', str(profile['threads']),
+        '-pix_fmt', profile['pixel_format'],
+        '-c:a', 'aac',
+        '-b:a', profile['audio_bitrate'],
+    ]
@@ -0,0 +1,108 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import model_registry
+
+# Whisper runs at once per process; each run already uses every core
+TRANSCRIBE_CONCURRENCY = int(os.environ.get('TRANSCRIBE_CONCURRENCY', 1))
+# Parts encoded at once per process, across all jobs
+ENCODE_CONCURRENCY = int(os.environ.get('ENCODE_CONCURRENCY', max(1, (os.cpu_count() or 2) // 2)))
+# Fixed memory budget for admitted jobs in bytes; 0 admits against MemAvailable instead
+MEMORY_BUDGET = int(os.environ.get('RENDER_MEMORY_BUDGET', 0))
+# Kept free when admitting against MemAvailable
+MEMORY_HEADROOM = int(os.environ.get('RENDER_MEMORY_HEADROOM', 512 * 1024 * 1024))
+
+# Rough resident size of one part being composed and encoded at 1080x1920:
+# readers, the frame buffer, x264 lookahead and the attention frame cache pages
+PART_MEMORY_BYTES = int(os.environ.get('PART_MEMORY_BYTES', 400 * 1024 * 1024))
+# Approximate CPU memory of each Whisper model once loaded
+WHISPER_MEMORY_BYTES = {
+    'tiny': 400 * 1024 * 1024,
+    'base': 600 * 1024 * 1024,
+    'small': 1200 * 1024 * 1024,
+    'medium': 3 * 1024 * 1024 * 1024,
+    'large': 6 * 1024 * 1024 * 1024,
+}
+
+
+def available_memory():
+    """MemAvailable from /proc/meminfo in bytes, or None where it isn't available"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def estimate_job_memory(params, workers=1):
+    """Rough peak memory of a render job described by its queue params"""
+    if params.get('split_mode') == 'copy':
+        # Stream copy never decodes a frame
+        return 64 * 1024 * 1024
+
+    estimate = PART_MEMORY_BYTES * max(1, workers)
+    model = params.get('whisper_model') or model_registry.DEFAULT_MODEL
+    if not any(name == model for name, _ in model_registry.loaded_models()):
+        estimate += WHISPER_MEMORY_BYTES.get(model.split('.')[0], WHISPER_MEMORY_BYTES['large'])
+    return estimate
+
+
+class ResourceScheduler:
+    """Limits for the render pipeline.
+
+    Transcription and encoding have separate per-process concurrency limits,
+    so one job's Whisper run doesn't stall every encode (or the other way
+    round). Jobs are admitted against a memory estimate: a job is refused
+    while the already admitted ones plus its estimate don't fit, but one job
+    is always admitted when nothing else runs, so a large job degrades to
+    running alone instead of never running. The admitted total is kept by
+    the job store, so it covers every worker process on the host.
+    """
+
+    def __init__(self, transcribe_slots=None, encode_slots=None, memory_budget=None):
+        self.transcribe_slots = threading.BoundedSemaphore(transcribe_slots or TRANSCRIBE_CONCURRENCY)
+        self.encode_slots = threading.BoundedSemaphore(encode_slots or ENCODE_CONCURRENCY)
+        self.memory_budget = MEMORY_BUDGET if memory_budget is None else memory_budget
+
+    @contextmanager
+    def transcription(self):
+        with self.transcribe_slots:
+            yield
+
+    @contextmanager
+    def encoding(self):
+        with self.encode_slots:
+            yield
+
+    def admits(self, estimate, reserved):
+        """Whether a job needing estimate bytes fits next to reserved bytes of running jobs"""
+        if not reserved:
+            return True
+        if self.memory_budget:
+            return reserved + estimate <= self.memory_budget
+        # MemAvailable already reflects what admitted jobs have allocated
+        free = available_memory()
+        return free is None or estimate <= free - MEMORY_HEADROOM
+
+    def stats(self):
+        return {
+            'memory_budget': self.memory_budget or None,
+            'available_bytes': available_memory(),
+        }
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ResourceScheduler()
+        return _default_scheduler
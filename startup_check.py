@@ -0,0 +1,87 @@
+"""Startup time check.
+
+Imports each entry module in a fresh interpreter a few times and fails when
+the median import time is over budget, or when the import pulls in a heavy
+dependency that should only be loaded on first use. Meant for CI:
+
+    python startup_check.py --max-seconds 1.0
+    python startup_check.py --modules app --runs 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+DEFAULT_MODULES = ['app', 'main', 'video_processor', 'batch']
+# Must not be imported just by starting the web app or the GUI
+HEAVY_MODULES = ['moviepy', 'whisper', 'torch']
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(','.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def measure(module, runs, repo_dir):
+    """Return (import seconds per run, heavy modules loaded) for one module"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [repo_dir, env.get('PYTHONPATH')]))
+    # Time the import itself, not an optional model warm-up
+    env.pop('WHISPER_WARMUP', None)
+
+    timings = []
+    heavy = set()
+    # app.py creates its upload/job folders in the working directory
+    with tempfile.TemporaryDirectory(prefix='startup_') as work_dir:
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f'import {module} failed:\n{result.stderr.decode(errors="replace")}')
+            seconds, loaded = result.stdout.decode().splitlines()[-2:]
+            timings.append(float(seconds))
+            heavy.update(filter(None, loaded.split(',')))
+    return timings, sorted(heavy)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that entry modules import quickly')
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, default=1.0,
+                        help='Budget for the median import time of each module')
+    parser.add_argument('--output', help='Write the measurements as JSON to this path')
+    args = parser.parse_args(argv)
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    failed = False
+    for module in args.modules:
+        timings, heavy = measure(module, args.runs, repo_dir)
+        median = statistics.median(timings)
+        ok = median <= args.max_seconds and not heavy
+        failed = failed or not ok
+        results[module] = {'median_seconds': median, 'runs': timings, 'heavy_imports': heavy}
+
+        line = f"{'ok' if ok else 'FAIL':>4}  {module:<16} {median:.3f}s"
+        if heavy:
+            line += f"  imports {', '.join(heavy)}"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'max_seconds': args.max_seconds, 'modules': results}, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import bisect
+import os
+import subprocess
+import threading
+
+from ffmpeg_render import FFMPEG_BINARY, run_with_progress
+from video_processor import part_ranges, part_ranges_for_count
+
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+# How far (seconds) a cut may move to land on a keyframe
+KEYFRAME_TOLERANCE = float(os.environ.get('KEYFRAME_TOLERANCE', 2.0))
+
+# Keyframe lists memoized by (path, size, mtime)
+_keyframes = {}
+_lock = threading.Lock()
+
+
+def _ffprobe(path, *args):
+    command = [FFPROBE_BINARY, '-v', 'error', *args, '-of', 'csv=p=0', path]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f'ffprobe failed: {result.stderr.decode(errors="replace").strip()}')
+    return result.stdout.decode()
+
+
+def probe_duration(path):
+    return float(_ffprobe(path, '-show_entries', 'format=duration').strip())
+
+
+def probe_start_time(path):
+    """Container start time; input -ss seeks are relative to it"""
+    start_time = _ffprobe(path, '-show_entries', 'format=start_time').strip()
+    return float(start_time) if start_time not in ('', 'N/A') else 0.0
+
+
+def probe_keyframes(path):
+    """Return the sorted keyframe timestamps of the first video stream.
+
+    Times are relative to the container start, like the -ss of a cut.
+    Reads packet flags only, so nothing is decoded. The result is cached
+    for as long as the file is unchanged.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if key in _keyframes:
+            return _keyframes[key]
+
+    start_time = probe_start_time(path)
+    output = _ffprobe(path, '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags')
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(round(float(pts_time) - start_time, 6))
+
+    keyframes = sorted(keyframes)
+    with _lock:
+        _keyframes[key] = keyframes
+    return keyframes
+
+
+def snap_cut(cut, keyframes, tolerance=None):
+    """Move a cut point onto a keyframe.
+
+    Uses the nearest keyframe within tolerance; otherwise the last keyframe
+    before the cut, which is where a stream copy would start anyway.
+    """
+    tolerance = KEYFRAME_TOLERANCE if tolerance is None else tolerance
+    if not keyframes:
+        return cut
+
+    index = bisect.bisect_left(keyframes, cut)
+    candidates = keyframes[max(0, index - 1):index + 1]
+    nearest = min(candidates, key=lambda keyframe: abs(keyframe - cut))
+    if abs(nearest - cut) <= tolerance:
+        return nearest
+    return keyframes[max(0, index - 1)]
+
+
+def snap_ranges(ranges, keyframes, tolerance=None):
+    """Snap the boundaries between consecutive (start, end) ranges to keyframes.
+
+    The first start and last end are kept; ranges that collapse after
+    snapping are merged into their neighbour.
+    """
+    if not ranges:
+        return []
+
+    cuts = [snap_cut(end, keyframes, tolerance) for _, end in ranges[:-1]]
+    boundaries = [ranges[0][0]] + cuts + [ranges[-1][1]]
+
+    snapped = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        if snapped and start < snapped[-1][1]:
+            start = snapped[-1][1]
+        if end > start:
+            snapped.append((start, end))
+    return snapped
+
+
+def plan_ranges(path, split_type, split_value, tolerance=None):
+    """Part ranges for a split request, with the cuts snapped to keyframes"""
+    total_duration = probe_duration(path)
+    if split_type == 'duration':
+        ranges = part_ranges(total_duration, float(split_value))
+    elif split_type == 'parts':
+        ranges = part_ranges_for_count(total_duration, int(split_value))
+    else:
+        ranges = [(0, total_duration)]
+    return snap_ranges(ranges, probe_keyframes(path), tolerance)
+
+
+def copy_part(path, start_time, end_time, output_path, on_frame=None):
+    """Cut one part with stream copy: no decode, no encode"""
+    command = [
+        FFMPEG_BINARY, '-y', '-loglevel', 'error',
+        '-ss', f'{start_time:.6f}', '-i', path,
+        '-t', f'{end_time - start_time:.6f}',
+        '-map', '0', '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        output_path,
+    ]
+    run_with_progress(command, on_frame)
+    return output_path
+
+
+def copy_split(path, ranges, output_paths, progress_callback=None):
+    """Stream-copy each range of path to the matching output path"""
+    total = len(ranges)
+    for i, ((start_time, end_time), output_path) in enumerate(zip(ranges, output_paths), 1):
+        copy_part(path, start_time, end_time, output_path)
+        if progress_callback:
+            progress_callback(i, total, output_path)
+    return list(output_paths)
@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Subtitle font file; falls back to DejaVu Sans Bold, which ships with most Linux images
+SUBTITLE_FONT = os.environ.get('SUBTITLE_FONT', 'Fervent-Bold.ttf')
+FALLBACK_FONT = 'DejaVuSans-Bold.ttf'
+
+# Bytes of rendered lines kept in memory per process (one 972 px line is about 0.25 MB)
+LINE_CACHE_MAX_BYTES = int(os.environ.get('SUBTITLE_LINE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Least recently used first
+_line_cache = OrderedDict()
+_line_cache_bytes = 0
+_line_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=32)
+def load_font(font, fontsize):
+    """Load a TrueType font by path or name, falling back when it isn't installed"""
+    for candidate in (font, FALLBACK_FONT):
+        try:
+            return ImageFont.truetype(candidate, fontsize)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def font_family(font, fontsize):
+    """(family, is_bold) of the font actually used, for renderers that look fonts up by name"""
+    family, style = load_font(font, fontsize).getname()
+    return family, 'bold' in (style or '').lower()
+
+
+def ass_font_size(font, fontsize):
+    """ASS Fontsize that draws font as large as Pillow does at fontsize.
+
+    Pillow sizes a font by its em, libass by its line height (ascent plus
+    descent), so the ASS size is scaled by that ratio. The metrics are read
+    at a large size so rounding doesn't skew the ratio.
+    """
+    ascent, descent = load_font(font, 1000).getmetrics()
+    return round(fontsize * (ascent + descent) / 1000, 2)
+
+
+def line_height(font, fontsize, stroke_width=2):
+    """Height of one rendered line strip; chunks stack lines at this pitch"""
+    ascent, descent = load_font(font, fontsize).getmetrics()
+    return ascent + descent + 2 * stroke_width
+
+
+def _readonly(array):
+    # Cached arrays are shared between clips, so nobody may draw into them
+    array.flags.writeable = False
+    return array
+
+
+def render_line(line, font, fontsize, width, stroke_width=2,
+                color=(255, 255, 255), stroke_color=(0, 0, 0)):
+    """Rasterize one line of text, centred in a transparent strip of the given width.
+
+    Lines are cached up to LINE_CACHE_MAX_BYTES, least recently used out first.
+    """
+    global _line_cache_bytes
+    key = (line, font, fontsize, width, stroke_width, color, stroke_color)
+    with _line_cache_lock:
+        strip = _line_cache.get(key)
+        if strip is not None:
+            _line_cache.move_to_end(key)
+            return strip
+
+    strip = _draw_line(line, font, fontsize, width, stroke_width, color, stroke_color)
+    with _line_cache_lock:
+        if key not in _line_cache:
+            _line_cache[key] = strip
+            _line_cache_bytes += strip.nbytes
+            while _line_cache_bytes > LINE_CACHE_MAX_BYTES and len(_line_cache) > 1:
+                _, evicted = _line_cache.popitem(last=False)
+                _line_cache_bytes -= evicted.nbytes
+    return strip
+
+
+def clear_cache():
+    """Drop every cached line"""
+    global _line_cache_bytes
+    with _line_cache_lock:
+        _line_cache.clear()
+        _line_cache_bytes = 0
+
+
+def _draw_line(line, font, fontsize, width, stroke_width, color, stroke_color):
+    pil_font = load_font(font, fontsize)
+    height = line_height(font, fontsize, stroke_width)
+
+    image = Image.new('RGBA', (int(width), height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.text(
+        (width / 2, stroke_width),
+        line,
+        font=pil_font,
+        fill=color + (255,),
+        stroke_width=stroke_width,
+        stroke_fill=stroke_color + (255,),
+        anchor='ma'
+    )
+    return _readonly(np.asarray(image))
+
+
+def _wrap(line, pil_font, width, stroke_width):
+    """Break a line further if it doesn't fit the width (same as caption wrapping)"""
+    words = line.split()
+    if not words:
+        return []
+    lines = [words[0]]
+    for word in words[1:]:
+        candidate = f'{lines[-1]} {word}'
+        if pil_font.getlength(candidate) + 2 * stroke_width <= width:
+            lines[-1] = candidate
+        else:
+            lines.append(word)
+    return lines
+
+
+def wrap_text(text, font, fontsize, width, stroke_width=2):
+    """The lines text is drawn as: its own line breaks, each wrapped to width"""
+    pil_font = load_font(font, fontsize)
+    lines = []
+    for line in text.split('\n'):
+        lines.extend(_wrap(line, pil_font, width, stroke_width))
+    return lines
+
+
+def render_text(text, font, fontsize, width, stroke_width=2):
+    """Rasterize a multi-line subtitle chunk into an RGBA array.
+
+    Lines come from the per-line cache, so a line repeated across chunks,
+    parts or jobs in the same process is only drawn once; the chunk itself
+    is just those strips stacked, so it isn't cached.
+    """
+    strips = [render_line(line, font, fontsize, width, stroke_width)
+              for line in wrap_text(text, font, fontsize, width, stroke_width)]
+    if not strips:
+        return _readonly(np.zeros((1, int(width), 4), dtype=np.uint8))
+    return _readonly(np.vstack(strips))
@@ -0,0 +1,110 @@
+import bisect
+
+
+class TranscriptIndex:
+    """Timestamped index over a full-length Whisper transcription.
+
+    Segments are kept sorted by start time so a part of the source can pull
+    its subtitles with a range query instead of transcribing its own audio.
+    """
+
+    def __init__(self, segments):
+        self.segments = sorted(
+            (self._normalize(segment) for segment in segments),
+            key=lambda segment: segment["start"]
+        )
+        self._starts = [segment["start"] for segment in self.segments]
+        # Longest segment bounds how far back a range query has to look
+        self._max_length = max(
+            (segment["end"] - segment["start"] for segment in self.segments),
+            default=0
+        )
+
+    @staticmethod
+    def _normalize(segment):
+        """Keep only the fields we need from a Whisper segment"""
+        words = [
+            {"word": word["word"], "start": float(word["start"]), "end": float(word["end"])}
+            for word in segment.get("words") or []
+        ]
+        return {
+            "start": float(segment["start"]),
+            "end": float(segment["end"]),
+            "text": segment["text"],
+            "words": words,
+        }
+
+    @classmethod
+    def from_result(cls, result, offset=0):
+        """Build an index from the dict returned by whisper's transcribe().
+
+        offset is added to every timestamp, for results transcribed from an
+        excerpt that starts offset seconds into the source.
+        """
+        segments = result["segments"]
+        if offset:
+            segments = [
+                dict(
+                    segment,
+                    start=segment["start"] + offset,
+                    end=segment["end"] + offset,
+                    words=[
+                        dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                        for word in segment.get("words") or []
+                    ],
+                )
+                for segment in segments
+            ]
+        return cls(segments)
+
+    def to_dict(self):
+        return {"segments": self.segments}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["segments"])
+
+    def query(self, start_time, end_time):
+        """Return the segments inside [start_time, end_time), re-based to start_time.
+
+        Segments that straddle a boundary are trimmed to the words whose
+        midpoint falls inside the range, so no word shows up in two parts.
+        """
+        first = bisect.bisect_left(self._starts, start_time - self._max_length)
+        last = bisect.bisect_left(self._starts, end_time)
+
+        result = []
+        for segment in self.segments[first:last]:
+            if segment["end"] <= start_time:
+                continue
+
+            if segment["start"] >= start_time and segment["end"] <= end_time:
+                seg_start, seg_end, text = segment["start"], segment["end"], segment["text"]
+            elif segment["words"]:
+                words = [
+                    word for word in segment["words"]
+                    if start_time <= (word["start"] + word["end"]) / 2 < end_time
+                ]
+                if not words:
+                    continue
+                seg_start, seg_end = words[0]["start"], words[-1]["end"]
+                text = "".join(word["word"] for word in words)
+            else:
+                # No word timings, so keep the segment in the part holding its midpoint
+                midpoint = (segment["start"] + segment["end"]) / 2
+                if not start_time <= midpoint < end_time:
+                    continue
+                seg_start, seg_end, text = segment["start"], segment["end"], segment["text"]
+
+            seg_start = max(seg_start, start_time)
+            seg_end = min(seg_end, end_time)
+            if seg_end <= seg_start:
+                continue
+
+            result.append({
+                "start": seg_start - start_time,
+                "end": seg_end - start_time,
+                "text": text,
+            })
+
+        return result
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import disk_cache
+
+# Cache location and size bound can be overridden per deployment
+CACHE_DIR = os.environ.get('TRANSCRIPT_CACHE_DIR', os.path.join('cache', 'transcripts'))
+CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Content digests memoized by (path, size, mtime) so a file is hashed once per process
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 of a file's bytes, hashing it at most once per process"""
+    stat_key = _stat_key(path)
+    with _digest_lock:
+        if stat_key in _digest_memo:
+            return _digest_memo[stat_key]
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with _digest_lock:
+        _digest_memo[stat_key] = digest
+    return digest
+
+
+def remember_digest(path, digest):
+    """Record a digest computed elsewhere (e.g. while streaming an upload)"""
+    with _digest_lock:
+        _digest_memo[_stat_key(path)] = digest
+
+
+class TranscriptCache:
+    """Size-bounded on-disk LRU cache of Whisper transcripts.
+
+    Entries are gzip-compressed JSON files named by a key derived from the
+    source content, the model name and the transcribe options. Recency is
+    tracked through file mtimes so the cache survives restarts and can be
+    shared by every worker process on the host.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, source_path, model_name, options=None):
+        """Build a cache key for a source file, model and transcribe options"""
+        payload = json.dumps({
+            'source': file_digest(source_path),
+            'model': model_name,
+            'options': options or {},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json.gz')
+
+    def get(self, key, count=True):
+        """Return the cached transcript for key, or None on a miss.
+
+        count=False leaves the hit/miss counters alone, for re-checks of a
+        lookup that was already counted.
+        """
+        path = self._entry_path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            if count:
+                with self._lock:
+                    self.misses += 1
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        disk_cache.touch(path)
+
+        if count:
+            with self._lock:
+                self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store a transcript and evict old entries past the size bound"""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            # Atomic rename so concurrent readers never see a partial entry
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        removed = disk_cache.evict(self.cache_dir, self.max_bytes, '.json.gz')
+        with self._lock:
+            self.evictions += len(removed)
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide transcript cache"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptCache()
+        return _default_cache
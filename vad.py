@@ -0,0 +1,277 @@
+import bisect
+import os
+
+import numpy as np
+
+# Whisper's input rate; every function here expects mono float32 at this rate
+SAMPLE_RATE = 16000
+
+# Gate transcription on detected speech; off sends the whole track to Whisper
+VAD_ENABLED = os.environ.get('TRANSCRIBE_VAD', '1').lower() not in ('0', 'false', 'no')
+
+FRAME_SECONDS = 0.03
+# Speech must stand this far above the noise floor (dB)
+ENERGY_MARGIN_DB = 12.0
+# ...but never further above it than this below the loud frames, so a track
+# that is speech throughout (no quiet floor to measure) is still kept
+LOUD_HEADROOM_DB = 10.0
+# Frames quieter than this are silence whatever the floor is (dB re. full scale)
+MIN_ENERGY_DB = -55.0
+# Share of a frame's energy that must sit in the voice band
+SPEECH_BAND = (250.0, 4000.0)
+MIN_BAND_RATIO = 0.3
+# Speech is modulated at the syllable rate (around 4 Hz) and its spectrum keeps
+# moving; sustained music and steady noise fail one test or the other. Both are
+# measured over CONTEXT_SECONDS around each frame.
+CONTEXT_SECONDS = 1.0
+MODULATION_BAND = (2.0, 8.0)
+# RMS of the voice-band level (dB) inside MODULATION_BAND
+MIN_MODULATION_DB = 0.8
+# Interquartile range of the voice-band spectral centroid over the loud frames (Hz)
+MIN_CENTROID_SPREAD = 60.0
+# Keep a region open this long after the last speech frame
+HANGOVER_SECONDS = 0.3
+MIN_SPEECH_SECONDS = 0.25
+# Regions closer than this are merged, and each is padded on both sides
+MERGE_GAP_SECONDS = 0.6
+PAD_SECONDS = 0.2
+# Whisper pads every call to 30 s, so short regions are packed together
+BATCH_SECONDS = 30.0
+BATCH_GAP_SECONDS = 0.2
+# Frames analysed per FFT call, so memory stays flat however long the track is
+FEATURE_BLOCK_FRAMES = 4096
+
+
+def settings():
+    """The detector parameters, for cache keys"""
+    return {
+        'frame': FRAME_SECONDS,
+        'margin_db': ENERGY_MARGIN_DB,
+        'headroom_db': LOUD_HEADROOM_DB,
+        'min_db': MIN_ENERGY_DB,
+        'band': SPEECH_BAND,
+        'band_ratio': MIN_BAND_RATIO,
+        'context': CONTEXT_SECONDS,
+        'modulation_band': MODULATION_BAND,
+        'modulation_db': MIN_MODULATION_DB,
+        'centroid_spread': MIN_CENTROID_SPREAD,
+        'hangover': HANGOVER_SECONDS,
+        'min_speech': MIN_SPEECH_SECONDS,
+        'merge_gap': MERGE_GAP_SECONDS,
+        'pad': PAD_SECONDS,
+    }
+
+
+def frame_features(samples, sample_rate=SAMPLE_RATE):
+    """Per-frame energy (dB), share of the energy inside SPEECH_BAND and
+    spectral centroid (Hz) within SPEECH_BAND"""
+    frame_length = int(sample_rate * FRAME_SECONDS)
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+
+    window = np.hanning(frame_length).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_length, 1 / sample_rate)
+    band = (freqs >= SPEECH_BAND[0]) & (freqs <= SPEECH_BAND[1])
+
+    energy_db = np.empty(count)
+    band_ratio = np.empty(count)
+    centroid = np.empty(count)
+    for first in range(0, count, FEATURE_BLOCK_FRAMES):
+        last = min(count, first + FEATURE_BLOCK_FRAMES)
+        frames = samples[first * frame_length:last * frame_length].reshape(-1, frame_length).astype(np.float32)
+        energy_db[first:last] = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+        band_power = power[:, band].sum(axis=1)
+        band_ratio[first:last] = band_power / (power.sum(axis=1) + 1e-10)
+        centroid[first:last] = power[:, band] @ freqs[band] / (band_power + 1e-10)
+    return energy_db, band_ratio, centroid
+
+
+def _bandpass(low, high, rate, taps):
+    """Windowed-sinc FIR band-pass filter for a signal sampled at rate"""
+    t = (np.arange(taps) - taps // 2) / rate
+    return (2 * high * np.sinc(2 * high * t) - 2 * low * np.sinc(2 * low * t)) / rate * np.hamming(taps)
+
+
+def _spread(values, valid, taps):
+    """Interquartile range of the valid values in a window of taps frames
+    centred on each frame; 0 where too few frames in the window are valid"""
+    half = taps // 2
+    # Invalid frames sort to the end of each window as inf
+    padded = np.pad(np.where(valid, values, np.inf), half, constant_values=np.inf)
+    counts = np.convolve(np.pad(valid, half).astype(np.int32), np.ones(taps, dtype=np.int32), mode='valid')
+
+    spread = np.zeros(len(values))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, taps)
+    for first in range(0, len(values), FEATURE_BLOCK_FRAMES):
+        last = min(len(values), first + FEATURE_BLOCK_FRAMES)
+        rows = first + np.flatnonzero(counts[first:last] >= max(1, taps // 4))
+        if len(rows) == 0:
+            continue
+        block = np.sort(windows[rows], axis=1)
+        n = counts[rows]
+        index = np.arange(len(rows))
+        spread[rows] = block[index, (0.75 * (n - 1)).astype(int)] - block[index, (0.25 * (n - 1)).astype(int)]
+    return spread
+
+
+def speech_like(level_db, centroid, loud):
+    """Per-frame flag: the frames around each one look like speech.
+
+    level_db is the voice-band level, floored at the detection threshold,
+    and loud marks the frames above it. Speech shows syllable-rate
+    modulation of the level and a spectral centroid that keeps moving;
+    a sustained or beat-driven chord repeats the same spectrum, and steady
+    noise has neither.
+    """
+    taps = int(round(CONTEXT_SECONDS / FRAME_SECONDS)) | 1
+    # Hold the level at the track's ends so its edges don't read as modulation
+    padded = np.pad(level_db, taps, mode='edge')
+    modulated = np.convolve(padded, _bandpass(*MODULATION_BAND, 1 / FRAME_SECONDS, taps), mode='same')[taps:-taps]
+    modulation_db = np.sqrt(np.convolve(modulated ** 2, np.ones(taps) / taps, mode='same'))
+    return (modulation_db > MIN_MODULATION_DB) & (_spread(centroid, loud, taps) > MIN_CENTROID_SPREAD)
+
+
+def _runs(mask):
+    """(first, last + 1) index pairs of the True runs in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_speech(samples, sample_rate=SAMPLE_RATE):
+    """Return the (start, end) seconds of the speech regions in samples.
+
+    A frame is speech when it is louder than the adaptive noise floor (a
+    low percentile of the track's frame energies) plus ENERGY_MARGIN_DB,
+    enough of its energy lies in the voice band and its surroundings pass
+    speech_like(), which rejects music and steady noise. Regions are held open for
+    HANGOVER_SECONDS, short blips dropped, near neighbours merged and the
+    result padded.
+    """
+    energy_db, band_ratio, centroid = frame_features(samples, sample_rate)
+    if len(energy_db) == 0:
+        return []
+
+    noise_floor, loud = np.percentile(energy_db, [10, 95])
+    threshold = max(min(noise_floor + ENERGY_MARGIN_DB, loud - LOUD_HEADROOM_DB), MIN_ENERGY_DB)
+    loud = energy_db > threshold
+    level_db = np.maximum(energy_db + 10 * np.log10(band_ratio + 1e-10), threshold)
+    speech = loud & (band_ratio > MIN_BAND_RATIO) & speech_like(level_db, centroid, loud)
+
+    # Hangover: a speech frame keeps the next few frames open
+    hangover = int(round(HANGOVER_SECONDS / FRAME_SECONDS))
+    if hangover:
+        speech = np.convolve(speech, np.ones(hangover + 1), mode='full')[:len(speech)] > 0
+
+    duration = len(samples) / sample_rate
+    regions = []
+    for first, last in _runs(speech):
+        start, end = int(first) * FRAME_SECONDS, int(last) * FRAME_SECONDS
+        if end - start - HANGOVER_SECONDS < MIN_SPEECH_SECONDS:
+            continue
+        start, end = max(0.0, start - PAD_SECONDS), min(duration, end + PAD_SECONDS)
+        if regions and start - regions[-1][1] <= MERGE_GAP_SECONDS:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+class SpeechBatch:
+    """Speech regions packed into one buffer, with the way back to source time"""
+
+    def __init__(self, samples, regions, sample_rate=SAMPLE_RATE):
+        gap = np.zeros(int(BATCH_GAP_SECONDS * sample_rate), dtype=np.float32)
+        pieces = []
+        # (offset in the buffer, source start, length), all in seconds
+        self.spans = []
+        position = 0.0
+        for start, end in regions:
+            piece = samples[int(start * sample_rate):int(end * sample_rate)]
+            if pieces:
+                pieces.append(gap)
+                position += len(gap) / sample_rate
+            pieces.append(piece)
+            self.spans.append((position, start, len(piece) / sample_rate))
+            position += len(piece) / sample_rate
+        self.audio = np.ascontiguousarray(np.concatenate(pieces), dtype=np.float32)
+        self._offsets = [span[0] for span in self.spans]
+
+    @property
+    def source_end(self):
+        _, start, length = self.spans[-1]
+        return start + length
+
+    def span_index(self, t):
+        """Index of the span a time in the packed buffer belongs to"""
+        return max(0, bisect.bisect_right(self._offsets, t) - 1)
+
+    def to_source(self, t, index=None):
+        """Map a time in the packed buffer back to the source track, clamped
+        to the span at index (by default the one t falls in)"""
+        if index is None:
+            index = self.span_index(t)
+        offset, start, length = self.spans[index]
+        return start + min(max(t - offset, 0.0), length)
+
+    def map_result(self, result):
+        """Whisper segments of this batch with their timestamps in source time.
+
+        A segment whose words fall in more than one span is split at the
+        span boundaries, so no segment covers the silence that was cut out
+        between two regions.
+        """
+        segments = []
+        for segment in result['segments']:
+            words = segment.get('words') or []
+            if not words:
+                index = self.span_index(segment['start'])
+                segments.append(dict(segment, start=self.to_source(segment['start'], index),
+                                     end=self.to_source(segment['end'], index), words=[]))
+                continue
+
+            # Consecutive words grouped by the span their midpoint falls in
+            groups = []
+            for word in words:
+                index = self.span_index((word['start'] + word['end']) / 2)
+                if not groups or groups[-1][0] != index:
+                    groups.append((index, []))
+                groups[-1][1].append(word)
+
+            for i, (index, group) in enumerate(groups):
+                start = segment['start'] if i == 0 else group[0]['start']
+                end = segment['end'] if i == len(groups) - 1 else group[-1]['end']
+                segments.append(dict(
+                    segment,
+                    start=self.to_source(start, index),
+                    end=self.to_source(end, index),
+                    text=segment['text'] if len(groups) == 1 else ''.join(word['word'] for word in group),
+                    words=[
+                        dict(word, start=self.to_source(word['start'], index),
+                             end=self.to_source(word['end'], index))
+                        for word in group
+                    ],
+                ))
+        return segments
+
+
+def batches(samples, regions, sample_rate=SAMPLE_RATE):
+    """Pack consecutive regions into SpeechBatches of at most BATCH_SECONDS.
+
+    Regions longer than that get a batch of their own; Whisper windows
+    long audio itself.
+    """
+    group = []
+    length = 0.0
+    for start, end in regions:
+        region_length = end - start + (BATCH_GAP_SECONDS if group else 0.0)
+        if group and length + region_length > BATCH_SECONDS:
+            yield SpeechBatch(samples, group, sample_rate)
+            group, length = [], 0.0
+            region_length = end - start
+        group.append((start, end))
+        length += region_length
+    if group:
+        yield SpeechBatch(samples, group, sample_rate)
@@ -1,19 +1,66 @@
-from moviepy.editor import VideoFileClip, CompositeVideoClip, clips_array, ColorClip, concatenate_videoclips, TextClip
-import numpy as np
 import os
-from moviepy.config import change_settings
-import whisper
-import tempfile
-import math
 import textwrap
+from transcript import TranscriptIndex
+from transcript_cache import get_cache, file_digest
+import model_registry
+import frame_cache
+import subtitle_renderer
+import render_profiles
+import vad
+import audio_cache
+import artifact_store as artifacts
+from scheduler import get_scheduler
+from instrumentation import Instrumentation, file_size
 
-# Configure ImageMagick path
-IMAGEMAGICK_BINARY = os.path.join(r"C:\Program Files\ImageMagick-7.1.1-Q16", "magick.exe")
-change_settings({"IMAGEMAGICK_BINARY": IMAGEMAGICK_BINARY})
+# Default render backend for new processors
+RENDER_BACKENDS = ('moviepy', 'ffmpeg')
+RENDER_BACKEND = os.environ.get('RENDER_BACKEND', 'moviepy')
+ATTENTION_PHASES = ('restart', 'continue')
+ATTENTION_PHASE = os.environ.get('ATTENTION_PHASE', 'restart')
+# Previews transcribe only their excerpt, with a small model, unless the full transcript is cached
+PREVIEW_WHISPER_MODEL = os.environ.get('PREVIEW_WHISPER_MODEL', 'tiny')
+PREVIEW_SECONDS = float(os.environ.get('PREVIEW_SECONDS', 10))
+
+def part_ranges(total_duration, duration_per_part):
+    """Return the (start, end) times of each part of the specified duration"""
+    ranges = []
+    
+    current_time = 0
+    while current_time < total_duration:
+        end_time = min(current_time + duration_per_part, total_duration)
+        ranges.append((current_time, end_time))
+        current_time = end_time
+        
+    return ranges
+
+def part_ranges_for_count(total_duration, num_parts):
+    """Return the (start, end) times of each part when splitting into num_parts"""
+    return part_ranges(total_duration, total_duration / num_parts)
 
 class VideoProcessor:
-    def __init__(self, gameplay_path, attention_path):
-        # Load the videos
+    def __init__(self, gameplay_path, attention_path, transcript_cache=None, render_backend=None,
+                 attention_phase=None, instrumentation=None, profile=None, artifact_store=None,
+                 scheduler=None):
+        self.gameplay_path = gameplay_path
+        self.attention_path = attention_path
+        
+        # Named encoder profile (codec, preset, CRF, threads, audio bitrate)
+        self.profile = profile or render_profiles.DEFAULT_PROFILE
+        render_profiles.get_profile(self.profile)
+        
+        # Structured stage/frame events; a no-op unless someone listens
+        self.instrumentation = instrumentation or Instrumentation()
+        
+        # Shared limits on concurrent transcription and encoding
+        self.scheduler = scheduler or get_scheduler()
+        
+        # "moviepy" composites frames in Python, "ffmpeg" renders with one filter graph
+        self.render_backend = render_backend or RENDER_BACKEND
+        if self.render_backend not in RENDER_BACKENDS:
+            raise ValueError(f"Unknown render backend: {self.render_backend}")
+        
+        # Load the videos (MoviePy is imported on first use to keep startup fast)
+        from moviepy.video.io.VideoFileClip import VideoFileClip
         self.gameplay = VideoFileClip(gameplay_path)
         self.attention = VideoFileClip(attention_path)
         
@@ -25,20 +72,36 @@ class VideoProcessor:
         self.gameplay_scale = 1.2
         self.attention_scale = 1.8
         
-        # Initialize whisper model
-        self.whisper_model = whisper.load_model("base")
+        # "restart" starts the attention loop at 0 in every part, "continue" carries
+        # the loop phase over from the previous part
+        self.attention_phase = attention_phase or ATTENTION_PHASE
+        if self.attention_phase not in ATTENTION_PHASES:
+            raise ValueError(f"Unknown attention phase: {self.attention_phase}")
+        self._attention_loop = None
+        
+        # Whisper model comes from the shared registry and is only loaded when needed
+        self.whisper_model_name = model_registry.DEFAULT_MODEL
         
         # Reduce max chars per line to ensure no more than 2 lines
         self.max_chars_per_line = 22
+        self.subtitle_font = subtitle_renderer.SUBTITLE_FONT  # Using bold font variant
+        self.subtitle_fontsize = 90
+        
+        # Full-length transcript of the gameplay audio, built on first use
+        self._transcript = None
+        self.transcript_cache = transcript_cache or get_cache()
+        self.transcribe_options = {"word_timestamps": True}
+        # Only detected speech goes to Whisper; silence and music are skipped
+        self.vad = vad.VAD_ENABLED
+        
+        # Subtitle overlays, gameplay layers and finished parts, keyed by their inputs
+        self.artifacts = artifact_store or artifacts.get_store()
+        self.store_layers = artifacts.ARTIFACT_LAYERS
+        self._layer_clips = []
         
-    def extract_audio_segment(self, start_time, end_time):
-        """Extract audio segment from gameplay video and save it temporarily"""
-        temp_audio_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        # Extract the exact segment we want to transcribe
-        audio_segment = self.gameplay.subclip(start_time, end_time).audio
-        # Write the audio segment starting from 0 for proper whisper processing
-        audio_segment.write_audiofile(temp_audio_file.name, fps=16000)
-        return temp_audio_file.name
+    @property
+    def whisper_model(self):
+        return model_registry.get_model(self.whisper_model_name)
         
     def split_text_into_chunks(self, text, max_lines=2):
         """Split text into chunks that fit within max_lines"""
@@ -64,100 +127,338 @@ class VideoProcessor:
             
         return chunks
         
-    def generate_subtitles(self, start_time, end_time):
-        """Generate subtitles using Whisper for the specified time segment"""
-        # Extract audio segment
-        audio_file = self.extract_audio_segment(start_time, end_time)
+    def audio_samples(self, start_time, end_time, build_cache=True):
+        """Mono float32 samples of the gameplay audio at Whisper's 16 kHz.
+
+        Decoded by one ffmpeg pipe into memory (and the shared track cache),
+        so Whisper gets the array directly and no temp WAV is written.
+        """
+        return audio_cache.samples(self.gameplay_path, start_time, end_time,
+                                   duration=self.gameplay.duration, build=build_cache)
         
-        try:
-            # Transcribe using whisper
-            result = self.whisper_model.transcribe(audio_file)
+    def transcript_settings(self):
+        """Everything besides the source and model that shapes the transcript"""
+        return dict(self.transcribe_options, vad=vad.settings() if self.vad else None)
+        
+    def transcript_cache_key(self):
+        return self.transcript_cache.make_key(
+            self.gameplay_path, self.whisper_model_name, self.transcript_settings()
+        )
+        
+    def cached_transcript(self, count=True):
+        """The full transcript if it is loaded or cached, without running Whisper"""
+        if self._transcript is None:
+            cached = self.transcript_cache.get(self.transcript_cache_key(), count=count)
+            if cached is not None:
+                self._transcript = TranscriptIndex.from_dict(cached)
+        return self._transcript
+        
+    def transcript(self):
+        """Transcribe the whole gameplay track once and return its index"""
+        # Re-runs on a known source skip Whisper entirely
+        if self.cached_transcript() is not None:
+            return self._transcript
+        
+        cache_key = self.transcript_cache_key()
+        
+        with self.scheduler.transcription():
+            # Another job may have transcribed the same source while this one waited;
+            # the miss was already counted above
+            if self.cached_transcript(count=False) is not None:
+                return self._transcript
             
-            # Process segments and create subtitle clips
-            subtitle_clips = []
-            for segment in result["segments"]:
-                text = segment["text"].strip()
-                if text:
-                    # Add a small delay compensation (0.285 seconds) to account for processing
-                    delay_compensation = 0.285
-                    
-                    # Since we extracted a segment starting at start_time, we need to:
-                    # 1. Take whisper's timing (which is relative to the extracted audio starting at 0)
-                    # 2. Add our delay compensation
-                    segment_start = segment["start"] + delay_compensation
-                    segment_end = segment["end"] + delay_compensation
-                    total_duration = segment_end - segment_start
-                    
-                    # Split text into chunks if it would result in more than 2 lines
-                    text_chunks = self.split_text_into_chunks(text, max_lines=2)
-                    chunk_duration = total_duration / len(text_chunks)
-                    
-                    # Create a clip for each chunk
-                    for i, chunk in enumerate(text_chunks):
-                        chunk_start = segment_start + (i * chunk_duration)
-                        
-                        # Add fade in/out effect for smooth transitions
-                        fade_duration = min(0.2, chunk_duration / 4)
-                        
-                        txt_clip = (TextClip(
-                            chunk,
-                            font='Fervent-Bold',  # Using bold font variant
-                            fontsize=90,
-                            color='white',
-                            size=(self.target_width * 0.9, None),
-                            method='caption',
-                            stroke_color='black',
-                            stroke_width=2
-                        )
-                        .set_duration(chunk_duration)
-                        .crossfadein(fade_duration)
-                        .crossfadeout(fade_duration))
-                        
-                        txt_clip = txt_clip.set_start(chunk_start)
-                        subtitle_clips.append(txt_clip)
+            if self.vad:
+                result = self.transcribe_speech()
+            else:
+                with self.instrumentation.stage('audio_extraction'):
+                    samples = self.audio_samples(0, self.gameplay.duration)
+                with self.instrumentation.stage('transcription'):
+                    # Word timings let parts trim segments that straddle a cut
+                    result = self.whisper_model.transcribe(samples, **self.transcribe_options)
+        self.instrumentation.emit('transcription_progress', seconds_processed=self.gameplay.duration,
+                                  total_seconds=self.gameplay.duration)
+        self._transcript = TranscriptIndex.from_result(result)
+        self.transcript_cache.put(cache_key, self._transcript.to_dict())
+        return self._transcript
         
-        finally:
-            # Clean up audio file
-            os.unlink(audio_file)
+    def transcribe_speech(self):
+        """Transcribe only the detected speech, with timestamps in source time.
+
+        Speech regions are packed into batches of up to 30 s, Whisper's own
+        window, so sparse speech costs a few calls instead of the full track.
+        """
+        duration = self.gameplay.duration
+        with self.instrumentation.stage('audio_extraction'):
+            samples = self.audio_samples(0, duration)
+        with self.instrumentation.stage('vad'):
+            regions = vad.detect_speech(samples)
+        
+        segments = []
+        with self.instrumentation.stage('transcription'):
+            for batch in vad.batches(samples, regions):
+                # Word timings let parts trim segments that straddle a cut
+                result = self.whisper_model.transcribe(batch.audio, **self.transcribe_options)
+                segments += batch.map_result(result)
+                self.instrumentation.emit('transcription_progress', seconds_processed=batch.source_end,
+                                          total_seconds=duration)
+        return {"segments": segments}
+        
+    def subtitle_chunks(self, start_time, end_time, transcript=None):
+        """Return the timed subtitle chunks for the specified time segment.
+
+        Each chunk is a dict with start, duration, fade and text, with times
+        relative to start_time. Shared by every render backend.
+        """
+        # Segments come back re-based so 0 is the start of this part
+        transcript = transcript or self.transcript()
+        segments = transcript.query(start_time, end_time)
+        
+        chunks = []
+        for segment in segments:
+            text = segment["text"].strip()
+            if text:
+                # Add a small delay compensation (0.285 seconds) to account for processing
+                delay_compensation = 0.285
+                
+                segment_start = segment["start"] + delay_compensation
+                segment_end = segment["end"] + delay_compensation
+                total_duration = segment_end - segment_start
+                
+                # Split text into chunks if it would result in more than 2 lines
+                text_chunks = self.split_text_into_chunks(text, max_lines=2)
+                chunk_duration = total_duration / len(text_chunks)
+                
+                for i, chunk in enumerate(text_chunks):
+                    chunks.append({
+                        "start": segment_start + (i * chunk_duration),
+                        "duration": chunk_duration,
+                        # Fade in/out for smooth transitions
+                        "fade": min(0.2, chunk_duration / 4),
+                        "text": chunk,
+                    })
+        
+        return chunks
+        
+    def subtitle_overlay_key(self, start_time, end_time):
+        """Artifact key of a part's rasterized subtitles"""
+        return self.artifacts.make_key(
+            'subtitles',
+            transcript=self.transcript_cache_key(),
+            start=round(start_time, 3),
+            end=round(end_time, 3),
+            font=self.subtitle_font,
+            fontsize=self.subtitle_fontsize,
+            width=int(self.target_width * 0.9),
+            max_chars=self.max_chars_per_line
+        )
+        
+    def subtitle_overlay(self, start_time, end_time):
+        """Timed chunks and their rasterized RGBA bitmaps for a part, from the artifact store when possible"""
+        key = self.subtitle_overlay_key(start_time, end_time)
+        stored = self.artifacts.get_arrays('subtitles', key)
+        if stored is not None:
+            return stored
+        
+        chunks = self.subtitle_chunks(start_time, end_time)
+        # Rasterized in-process; identical lines come from the glyph cache
+        bitmaps = [
+            subtitle_renderer.render_text(
+                chunk["text"],
+                self.subtitle_font,
+                self.subtitle_fontsize,
+                int(self.target_width * 0.9)
+            )
+            for chunk in chunks
+        ]
+        self.artifacts.put_arrays('subtitles', key, chunks, bitmaps)
+        return chunks, bitmaps
+        
+    def generate_subtitles(self, start_time, end_time):
+        """Generate subtitle clips for the specified time segment from the full transcript"""
+        import clips
+        
+        subtitle_clips = []
+        for chunk, rgba in zip(*self.subtitle_overlay(start_time, end_time)):
+            txt_clip = clips.SubtitleClip(rgba, chunk["duration"], chunk["fade"])
+            txt_clip = txt_clip.set_start(chunk["start"])
+            subtitle_clips.append(txt_clip)
         
         return subtitle_clips
         
+    def layout(self):
+        """Pixel geometry of the output layout, shared by every render backend"""
+        source_width, source_height = self.gameplay.size
+        attention_source_width, attention_source_height = self.attention.size
+        
+        # Gameplay scaled up and centred around 30% of the frame height
+        gameplay_width = int(self.target_width * self.gameplay_scale)
+        gameplay_height = int(source_height * gameplay_width / source_width)
+        gameplay_y = (self.target_height * 0.3) - (gameplay_height / 2)
+        
+        # Attention video scaled up more and placed below with a 20px gap
+        attention_width = int(self.target_width * self.attention_scale)
+        attention_height = int(attention_source_height * attention_width / attention_source_width)
+        attention_y = gameplay_y + gameplay_height + 20
+        
+        return {
+            "width": self.target_width,
+            "height": self.target_height,
+            "gameplay_size": (gameplay_width, gameplay_height),
+            "gameplay_position": (-(gameplay_width - self.target_width) / 2, gameplay_y),
+            "attention_size": (attention_width, attention_height),
+            "attention_position": (-(attention_width - self.target_width) / 2, attention_y),
+            "subtitle_y": gameplay_y + gameplay_height - 100,
+        }
+        
+    def preview_transcript(self, start_time, end_time):
+        """The cached full transcript, or a quick one of just [start_time, end_time)"""
+        transcript = self.cached_transcript()
+        if transcript is not None:
+            return transcript
+        
+        # Only the excerpt is decoded unless the full track is already cached
+        samples = self.audio_samples(start_time, end_time, build_cache=False)
+        # Pinned, so a preview doesn't evict the model the next job needs
+        model = model_registry.get_model(PREVIEW_WHISPER_MODEL, pinned=True)
+        result = model.transcribe(samples, **self.transcribe_options)
+        # Shift back to source time so it queries like the full transcript
+        return TranscriptIndex.from_result(result, offset=start_time)
+        
+    def preview_frame(self, start_time, t, layout, chunks, scale):
+        """One composed frame at t seconds into the part, drawn at scale with Pillow"""
+        from PIL import Image
+        import clips
+        
+        width = round(layout["width"] * scale)
+        height = round(layout["height"] * scale)
+        canvas = Image.new("RGB", (width, height))
+        
+        attention_time = start_time + t if self.attention_phase == 'continue' else t
+        layers = [
+            ("gameplay", self.gameplay.get_frame(start_time + t)),
+            ("attention", self.attention.get_frame(attention_time % self.attention.duration)),
+        ]
+        for name, frame in layers:
+            layer_width, layer_height = layout[f"{name}_size"]
+            x, y = layout[f"{name}_position"]
+            image = Image.fromarray(frame).resize(
+                (max(1, round(layer_width * scale)), max(1, round(layer_height * scale))),
+                Image.BILINEAR
+            )
+            canvas.paste(image, (round(x * scale), round(y * scale)))
+        
+        for chunk in chunks:
+            if not chunk["start"] <= t < chunk["start"] + chunk["duration"]:
+                continue
+            # Rasterized at full size so line wrapping matches the real render
+            rgba = subtitle_renderer.render_text(
+                chunk["text"], self.subtitle_font, self.subtitle_fontsize, int(self.target_width * 0.9)
+            )
+            text = Image.fromarray(rgba).resize(
+                (max(1, round(rgba.shape[1] * scale)), max(1, round(rgba.shape[0] * scale))),
+                Image.BILINEAR
+            )
+            opacity = clips.fade_factor(t - chunk["start"], chunk["duration"], chunk["fade"])
+            mask = text.getchannel("A").point(lambda alpha: int(alpha * opacity))
+            canvas.paste(text, ((width - text.width) // 2, round(layout["subtitle_y"] * scale)), mask)
+        
+        return canvas
+        
+    def preview(self, start_time=0, end_time=None, frames=4, scale=0.25):
+        """Low-resolution contact sheet of a few composed stills, as a PIL image.
+
+        Uses the same layout and subtitle chunks as a full render but only
+        decodes the sampled frames, so layout mistakes show up in seconds.
+        """
+        from PIL import Image
+        
+        if end_time is None:
+            end_time = min(self.gameplay.duration, start_time + PREVIEW_SECONDS)
+        layout = self.layout()
+        chunks = self.subtitle_chunks(start_time, end_time, self.preview_transcript(start_time, end_time))
+        
+        # Stills at the middle of equal slices of the excerpt
+        step = (end_time - start_time) / frames
+        stills = [self.preview_frame(start_time, (i + 0.5) * step, layout, chunks, scale)
+                  for i in range(frames)]
+        
+        sheet = Image.new("RGB", (sum(still.width for still in stills), stills[0].height))
+        for i, still in enumerate(stills):
+            sheet.paste(still, (i * still.width, 0))
+        return sheet
+        
+    def attention_loop(self):
+        """Muted, resized attention video looped endlessly, shared by every part"""
+        import clips
+        from moviepy.video.fx.resize import resize
+        
+        if self._attention_loop is None:
+            attention_resized = self.attention.fx(resize, width=self.target_width * self.attention_scale)
+            attention_resized = attention_resized.without_audio()  # Mute second video
+            # One loop decoded and scaled once, or None to stream when it's too large
+            frames = frame_cache.load_frames(attention_resized, self.attention_path)
+            self._attention_loop = clips.LoopingClip(attention_resized, frames=frames)
+        return self._attention_loop
+        
+    def gameplay_layer(self, start_time, end_time):
+        """The part's gameplay scaled to its layout width (no audio).
+
+        With store_layers the scaled layer is encoded once, near-losslessly,
+        into the artifact store, so re-renders of the same part with another
+        attention clip or profile decode it instead of resizing every frame.
+        """
+        from moviepy.video.fx.resize import resize
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        
+        width = self.target_width * self.gameplay_scale
+        gameplay_resized = self.gameplay.subclip(start_time, end_time).fx(resize, width=width)
+        if not self.store_layers:
+            return gameplay_resized.without_audio()
+        
+        key = self.artifacts.make_key(
+            'gameplay_layer',
+            source=file_digest(self.gameplay_path),
+            start=round(start_time, 3),
+            end=round(end_time, 3),
+            width=width
+        )
+        path = self.artifacts.get('gameplay_layer', key, '.mp4')
+        if path is None:
+            temp_path = self.artifacts.temp_path('gameplay_layer', '.mp4')
+            try:
+                with self.instrumentation.stage('gameplay_layer', part=start_time):
+                    gameplay_resized.write_videofile(temp_path, codec='libx264', preset='veryfast',
+                                                     ffmpeg_params=['-crf', '10'], audio=False, logger=None)
+                path = self.artifacts.commit(temp_path, 'gameplay_layer', key, '.mp4')
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        
+        layer = VideoFileClip(path, audio=False)
+        self._layer_clips.append(layer)
+        return layer
+        
     def process_videos(self, start_time=0, end_time=None):
+        import compositor
+        
         if end_time is None:
             end_time = self.gameplay.duration
 
         # Get gameplay subclip
         gameplay_clip = self.gameplay.subclip(start_time, end_time)
         
-        # Calculate how many times we need to loop the attention video
+        # Take this part's stretch of the endless attention loop
         clip_duration = end_time - start_time
-        attention_full_duration = self.attention.duration
-        loops_needed = int(np.ceil(clip_duration / attention_full_duration))
-        
-        # Create a list to store the attention video segments
-        attention_segments = []
-        remaining_duration = clip_duration
-        current_time = 0
-        
-        # Create the looped attention video
-        while remaining_duration > 0:
-            segment_duration = min(remaining_duration, attention_full_duration)
-            segment = self.attention.subclip(0, segment_duration)
-            attention_segments.append(segment)
-            remaining_duration -= segment_duration
-            current_time += segment_duration
-        
-        # Concatenate all attention segments
-        attention_clip = concatenate_videoclips(attention_segments)
+        attention_offset = start_time if self.attention_phase == 'continue' else 0
+        attention_resized = self.attention_loop().view(attention_offset, clip_duration)
             
         # Resize gameplay video (scaled up and positioned higher)
-        gameplay_resized = gameplay_clip.resize(width=self.target_width * self.gameplay_scale)
+        gameplay_resized = self.gameplay_layer(start_time, end_time)
         gameplay_height = gameplay_resized.h
         gameplay_y = (self.target_height * 0.3) - (gameplay_height / 2)
         
-        # Resize attention video (scaled up more and positioned below)
-        attention_resized = attention_clip.resize(width=self.target_width * self.attention_scale)
-        attention_resized = attention_resized.without_audio()  # Mute second video
+        # Attention video (scaled up more and positioned below)
         attention_height = attention_resized.h
         attention_y = gameplay_y + gameplay_height + 20  # 20px gap
         
@@ -166,7 +467,8 @@ class VideoProcessor:
         attention_x = -(attention_resized.w - self.target_width) / 2
         
         # Generate subtitles
-        subtitle_clips = self.generate_subtitles(start_time, end_time)
+        with self.instrumentation.stage('subtitles', part=start_time):
+            subtitle_clips = self.generate_subtitles(start_time, end_time)
         
         # Position all subtitle clips
         subtitle_y = gameplay_y + gameplay_height - 100  # Changed from -150 to -100
@@ -174,43 +476,164 @@ class VideoProcessor:
         for sub_clip in subtitle_clips:
             sub_w = sub_clip.w if hasattr(sub_clip, 'w') else self.target_width * 0.9
             subtitle_x = (self.target_width - sub_w) / 2
-            positioned_sub = sub_clip.set_position((subtitle_x, subtitle_y))
-            positioned_subtitles.append(positioned_sub)
+            positioned_subtitles.append((sub_clip, (subtitle_x, subtitle_y)))
         
-        # Create black background
-        background = ColorClip(size=(self.target_width, self.target_height), 
-                             color=(0, 0, 0),
-                             duration=end_time - start_time)
+        # Fixed layout on a black background, blitted into one reused frame buffer
+        final_video = compositor.LayoutClip(
+            (self.target_width, self.target_height),
+            layers=[(gameplay_resized, (gameplay_x, gameplay_y)),
+                    (attention_resized, (attention_x, attention_y))],
+            subtitles=positioned_subtitles,
+            duration=clip_duration
+        )
+        final_video.fps = gameplay_clip.fps
+        final_video.audio = gameplay_clip.audio
         
-        # Set the duration for both clips explicitly
-        gameplay_positioned = gameplay_resized.set_position((gameplay_x, gameplay_y)).set_duration(end_time - start_time)
-        attention_positioned = attention_resized.set_position((attention_x, attention_y)).set_duration(end_time - start_time)
+        return final_video
+    
+    def part_params(self, start_time, end_time):
+        """Everything a rendered part depends on"""
+        return {
+            'gameplay': file_digest(self.gameplay_path),
+            'attention': file_digest(self.attention_path),
+            'start': round(start_time, 3),
+            'end': round(end_time, 3),
+            'options': self.render_options(),
+            'whisper_model': self.whisper_model_name,
+            'transcript_settings': self.transcript_settings(),
+            'subtitle_font': self.subtitle_font,
+            'subtitle_fontsize': self.subtitle_fontsize,
+        }
+    
+    def render_part(self, start_time, end_time, output_path):
+        """Compose and encode a single part to output_path.
+
+        A part rendered before from identical inputs is linked from the
+        artifact store instead. New renders are written next to output_path
+        and renamed over it, so a file linked into (or from) the store is
+        never truncated by the next render to the same path.
+        """
+        suffix = os.path.splitext(output_path)[1]
+        key = self.artifacts.make_key('part', **self.part_params(start_time, end_time))
+        stored = self.artifacts.get('part', key, suffix)
+        if stored is not None:
+            self.artifacts.materialize(stored, output_path)
+            frames = self.frame_count(start_time, end_time)
+            self.instrumentation.emit('frames_encoded', part=start_time, frame=frames, total_frames=frames)
+            self.instrumentation.emit('bytes_written', part=start_time, path=output_path,
+                                      bytes=file_size(output_path))
+            return output_path
+        
+        # Keep the extension: both backends pick the container from it
+        temp_path = f'{os.path.splitext(output_path)[0]}.{os.getpid()}.tmp{suffix}'
+        # Transcribe before taking an encode slot so Whisper never holds one;
+        # MoviePy parts with stored subtitles don't need the transcript at all
+        if (self.render_backend == 'ffmpeg'
+                or not self.artifacts.contains('subtitles', self.subtitle_overlay_key(start_time, end_time), '.npz')):
+            self.transcript()
+        try:
+            with self.scheduler.encoding():
+                if self.render_backend == 'ffmpeg':
+                    import ffmpeg_render
+                    ffmpeg_render.render_part(self, start_time, end_time, temp_path)
+                else:
+                    self.render_part_moviepy(start_time, end_time, temp_path)
+            os.replace(temp_path, output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
         
-        # Create final composition with background
-        clips_to_compose = [background, gameplay_positioned, attention_positioned] + positioned_subtitles
-        final_video = CompositeVideoClip(
-            clips_to_compose,
-            size=(self.target_width, self.target_height)
-        ).set_duration(end_time - start_time)
+        self.instrumentation.emit('bytes_written', part=start_time, path=output_path,
+                                  bytes=file_size(output_path))
+        # Kept only when it can be hard-linked; a copy would double the part's disk writes
+        self.artifacts.put_file('part', key, suffix, output_path, link_only=True)
+        return output_path
+    
+    def render_part_moviepy(self, start_time, end_time, output_path):
+        """Composite in Python and encode with MoviePy"""
+        with self.instrumentation.stage('compose', part=start_time):
+            final_video = self.process_videos(start_time, end_time)
         
-        return final_video
+        # Only replace MoviePy's console bar when someone consumes the frame events
+        logger = 'bar'
+        if self.instrumentation.listeners:
+            logger = self.instrumentation.frame_logger(part=start_time)
+        try:
+            with self.instrumentation.stage('encode', part=start_time):
+                final_video.write_videofile(output_path, logger=logger,
+                                            **render_profiles.moviepy_options(self.profile,
+                                                                              end_time - start_time))
+        finally:
+            # Release this part's readers and buffers before the next part is built
+            self.close_part(final_video)
+        return output_path
+    
+    def frame_count(self, start_time, end_time):
+        """Number of frames MoviePy will encode for a part"""
+        return int((end_time - start_time) * self.gameplay.fps)
+    
+    def render_options(self):
+        """Constructor options that change what a part looks like"""
+        return {
+            "render_backend": self.render_backend,
+            "attention_phase": self.attention_phase,
+            "profile": self.profile,
+        }
+    
+    def worker_options(self):
+        """Options a worker process needs to rebuild this processor.
+
+        The input digests go along so spawned workers don't hash the files again.
+        """
+        return {
+            **self.render_options(),
+            "digests": {path: file_digest(path) for path in (self.gameplay_path, self.attention_path)},
+        }
+    
+    def part_ranges(self, duration_per_part):
+        """Return the (start, end) times of each part of the specified duration"""
+        return part_ranges(self.gameplay.duration, duration_per_part)  # Use gameplay duration as the total
+    
+    def part_ranges_for_count(self, num_parts):
+        """Return the (start, end) times of each part when splitting into num_parts"""
+        return part_ranges_for_count(self.gameplay.duration, num_parts)
     
     def split_by_duration(self, duration_per_part):
-        """Split video into parts of specified duration"""
-        total_duration = self.gameplay.duration  # Use gameplay duration as the total
-        parts = []
-        
-        current_time = 0
-        while current_time < total_duration:
-            end_time = min(current_time + duration_per_part, total_duration)
-            part = self.process_videos(current_time, end_time)
-            parts.append(part)
-            current_time = end_time
-            
-        return parts
+        """Yield the parts of specified duration one at a time.
+
+        Each part is only composed when asked for; close it with close_part
+        before taking the next one.
+        """
+        for start_time, end_time in self.part_ranges(duration_per_part):
+            yield self.process_videos(start_time, end_time)
     
     def split_by_parts(self, num_parts):
-        """Split video into specified number of parts"""
+        """Yield the specified number of parts one at a time"""
         total_duration = self.gameplay.duration  # Use gameplay duration as the total
         duration_per_part = total_duration / num_parts
-        return self.split_by_duration(duration_per_part) 
\ No newline at end of file
+        return self.split_by_duration(duration_per_part)
+    
+    def close_part(self, part):
+        """Close the readers opened for one part.
+
+        Subclips of the gameplay and attention share the processor's own
+        readers, so only per-part readers (stored gameplay layers) are closed.
+        """
+        if part is not None:
+            part.close()
+        for layer in self._layer_clips:
+            layer.close()
+        self._layer_clips = []
+    
+    def close(self):
+        """Close every reader (ffmpeg subprocess) this processor holds"""
+        self.close_part(None)
+        self._attention_loop = None
+        self.gameplay.close()
+        self.attention.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close() 
\ No newline at end of file